@@ -2,39 +2,16 @@
 import logging
 logging.basicConfig(level=logging.CRITICAL)
 
-from pytrips.ontology import load as load_ontology
-from pytrips.helpers import Normalize
-from pytrips.tools import nlp
+from pytrips.tools import load_nlp
+from pytrips.tools.spacy import add_trips_tagger
 
-ont = load_ontology()
+nlp = add_trips_tagger(load_nlp())
 
-word_cache = {}
 
-def lookup_word(query):
-    word, lemma, pos = query
-    # word lookup:
-    wlookup = ont[("q::"+word, pos)]
-    llookup = ont[("q::"+lemma, pos)]
-
-    res = wlookup["lex"]
-    res += wlookup["wn"]
-    res += llookup["lex"]
-    res += llookup["wn"]
-
-    return set(res)
-
-def tag_word(token):
-    pos = Normalize.spacy_pos(token.pos_)
-    word = token.text.lower()
-    lemma = token.lemma_
-
-    if pos not in "nvar": # if the pos is not in wordnet
-        return set()
-
-    query = (word, lemma, pos)
-    return word_cache[(word, lemma, pos)]
+def tag_sentence(sentence):
+    return [(token._.trips, token) for token in nlp(sentence)]
 
 
-def tag_sentence(sentence):
-    sentence = nlp(sentence)
-    return zip([tag_word(token) for token in sentence], sentence)
+def tag_sentences(sentences, batch_size=1000, n_process=1):
+    for doc in nlp.pipe(sentences, batch_size=batch_size, n_process=n_process):
+        yield [(token._.trips, token) for token in doc]
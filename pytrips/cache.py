@@ -0,0 +1,244 @@
+from collections import OrderedDict, Counter
+import hashlib
+import io
+import json
+import os
+import pickle
+import sqlite3
+import threading
+
+from nltk.corpus.reader.wordnet import Synset
+
+from .helpers import wn
+from .structures import TripsType
+
+# returned by QueryCache.get when a key is not cached, None is a valid result
+MISSING = object()
+
+# entries kept per namespace unless a limit is given
+DEFAULT_MAXSIZE = 65536
+
+_namespaces = ("w", "wn", "q", "p", "d", "ont")
+
+
+def query_namespace(key):
+    """The kind of query a Trips key represents: "w", "wn", "q", "p", "d" or "ont" """
+    if type(key) is tuple and len(key) == 2:
+        key = key[0]
+    if type(key) is Synset:
+        return "wn"
+    if type(key) is not str:
+        return "ont"
+    prefix = key.split("::", 1)[0].lower()
+    if prefix != key and prefix in _namespaces:
+        return prefix
+    return "ont"
+
+
+class QueryCache(object):
+    """
+    LRU cache of Trips query results with a separate limit per namespace.
+
+    maxsize is the limit for every namespace without an entry in limits, a
+    limit of None means the namespace is never evicted.  Hits, misses and
+    evictions are counted per namespace, see stats.  Only the configuration
+    survives pickling, the entries are dropped.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, limits=None):
+        self.maxsize = maxsize
+        self.limits = dict(limits or {})
+        self._entries = {}
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = Counter()
+
+    def limit(self, namespace):
+        return self.limits.get(namespace, self.maxsize)
+
+    def _namespace(self, namespace):
+        if namespace not in self._entries:
+            self._entries[namespace] = OrderedDict()
+        return self._entries[namespace]
+
+    def get(self, key, default=MISSING):
+        namespace = query_namespace(key)
+        entries = self._namespace(namespace)
+        if key in entries:
+            self.hits[namespace] += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses[namespace] += 1
+        return default
+
+    def put(self, key, value):
+        namespace = query_namespace(key)
+        entries = self._namespace(namespace)
+        entries[key] = value
+        entries.move_to_end(key)
+        self._evict(namespace)
+
+    def _evict(self, namespace):
+        limit = self.limit(namespace)
+        entries = self._namespace(namespace)
+        if limit is None:
+            return
+        while len(entries) > limit:
+            entries.popitem(last=False)
+            self.evictions[namespace] += 1
+
+    def resize(self, maxsize, namespace=None):
+        """Set the limit of a namespace, or the default limit if namespace
+        is None, and evict anything over it"""
+        if namespace is None:
+            self.maxsize = maxsize
+        else:
+            self.limits[namespace] = maxsize
+        for n in list(self._entries):
+            self._evict(n)
+
+    def clear(self, namespace=None):
+        """Drop cached entries, of a single namespace if given.  Counters are kept."""
+        if namespace is None:
+            self._entries = {}
+        else:
+            self._entries.pop(namespace, None)
+
+    def stats(self):
+        """{namespace: {"size", "limit", "hits", "misses", "evictions"}}"""
+        namespaces = set(self._entries) | set(self.hits) | set(self.misses)
+        return {n: {
+            "size": len(self._entries.get(n, ())),
+            "limit": self.limit(n),
+            "hits": self.hits[n],
+            "misses": self.misses[n],
+            "evictions": self.evictions[n]
+        } for n in namespaces}
+
+    def __len__(self):
+        return sum(len(e) for e in self._entries.values())
+
+    def __contains__(self, key):
+        return key in self._entries.get(query_namespace(key), ())
+
+    def __getstate__(self):
+        return {"maxsize": self.maxsize, "limits": self.limits}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+# namespaces of __getitem__ results kept in a PersistentCache, "q" results
+# are kept by Trips.lookup and "ont" lookups are cheaper than the cache
+PERSISTED = ("w", "wn", "p", "d")
+
+
+def persistent_key(key):
+    """The text a Trips key is stored under in a PersistentCache, or None
+    if its results are not persisted"""
+    if query_namespace(key) not in PERSISTED:
+        return None
+    pos = None
+    if type(key) is tuple:
+        key, pos = key
+    if type(key) is Synset:
+        key = "wn::" + key.name()
+    return json.dumps([key.lower(), pos])
+
+
+class PersistentCache(object):
+    """
+    Query results of ont kept in an SQLite database, so that they outlive
+    the process and are shared by every process on the host.
+
+    The database is in WAL mode, readers never block and concurrent writers
+    wait for each other.  Entries are keyed by version (anything that
+    identifies the ontology and the options it was loaded with, see
+    snapshot_key) and the query.  Values are pickled with types and synsets
+    replaced by their names, so they are rebuilt as the types of ont.  Each
+    process and thread opens its own connection.
+    """
+
+    def __init__(self, ont, path, version=None, timeout=30):
+        self.ont = ont
+        self.path = path
+        self.version = version
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._version = hashlib.sha1(
+            json.dumps(version, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        self._local = threading.local()
+
+    def _connection(self):
+        pid, conn = getattr(self._local, "conn", (None, None))
+        # connections can not be shared with a forked child
+        if pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS queries ("
+                         "version TEXT, key TEXT, value BLOB, PRIMARY KEY (version, key)"
+                         ") WITHOUT ROWID")
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def _dumps(self, value):
+        out = io.BytesIO()
+        pickler = pickle.Pickler(out, protocol=pickle.HIGHEST_PROTOCOL)
+
+        def persistent_id(obj):
+            if type(obj) is TripsType:
+                return ("type", obj.name)
+            if type(obj) is Synset:
+                return ("synset", obj.name())
+            return None
+        pickler.persistent_id = persistent_id
+        pickler.dump(value)
+        return out.getvalue()
+
+    def _loads(self, data):
+        unpickler = pickle.Unpickler(io.BytesIO(data))
+
+        def persistent_load(pid):
+            kind, name = pid
+            if kind == "type":
+                return self.ont.get_trips_type(name)
+            return wn.synset(name)
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+    def get(self, key, default=MISSING):
+        row = self._connection().execute(
+            "SELECT value FROM queries WHERE version = ? AND key = ?", (self._version, key)).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return self._loads(row[0])
+
+    def put(self, key, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO queries VALUES (?, ?, ?)", (self._version, key, self._dumps(value)))
+
+    def clear(self, all_versions=False):
+        """Drop the entries of this version, or of every version"""
+        if all_versions:
+            self._connection().execute("DELETE FROM queries")
+        else:
+            self._connection().execute("DELETE FROM queries WHERE version = ?", (self._version,))
+
+    def __len__(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM queries WHERE version = ?", (self._version,)).fetchone()[0]
+
+    def stats(self):
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+    def __getstate__(self):
+        return {"ont": self.ont, "path": self.path, "version": self.version, "timeout": self.timeout}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
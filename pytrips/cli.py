@@ -0,0 +1,231 @@
+"""
+The pytrips command.
+
+    pytrips query [FILE]     answer JSONL queries from FILE (or stdin), one
+                             json result per line on stdout
+    pytrips compile          compile the snapshot (and the shared file)
+    pytrips serve            serve queries over a unix socket or tcp port
+
+A query line is a json string ("w::cat"), a [query, pos] pair or an object
+{"query": "w::cat", "pos": "n"}.  Each output line is
+{"query": ..., "pos": ..., "result": ...} with types written as "ont::name"
+(see Trips.dump_result), or {"input": ..., "error": ...} for a bad line.
+
+Input is read and answered in chunks, with at most two chunks per worker in
+flight, so memory does not grow with the input.  Every worker loads the
+compiled ontology once.  Query counts and throughput per namespace are
+reported on stderr at the end.
+"""
+from collections import deque
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+
+from .cache import query_namespace
+from .ontology import Trips
+
+# ontology of a query worker process
+_worker = {}
+
+
+def _parse(line):
+    """(query, pos) of a JSONL query line"""
+    q = json.loads(line)
+    if type(q) is dict:
+        query, pos = q["query"], q.get("pos")
+    elif type(q) is list:
+        query, pos = q
+    elif type(q) is str:
+        query, pos = q, None
+    else:
+        raise ValueError("not a query: {}".format(line))
+    if type(query) is not str or not (pos is None or type(pos) is str):
+        raise TypeError("query and pos must be strings: {}".format(line))
+    return query, pos
+
+
+def _options(args):
+    return {"skip_lexicon": args.skip_lexicon, "use_gloss": args.gloss, "shared": args.shared,
+            "persistent_cache": args.persistent_cache}
+
+
+def _open_ontology(options):
+    if options["shared"]:
+        from .shared import attach
+        return attach(skip_lexicon=options["skip_lexicon"], use_gloss=options["use_gloss"],
+                      persistent_cache=options.get("persistent_cache"))
+    from .ontology import get_ontology
+    return get_ontology(skip_lexicon=options["skip_lexicon"], use_gloss=options["use_gloss"],
+                        persistent_cache=options.get("persistent_cache"))
+
+
+def answer(ont, lines):
+    """Answer raw JSONL query lines.  Returns the output lines and
+    {namespace: [queries, seconds]}."""
+    out = []
+    stats = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        start = time.perf_counter()
+        try:
+            query, pos = _parse(line)
+            res = Trips.dump_result(ont[(query, pos) if pos else query])
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            out.append(json.dumps({"input": line, "error": str(e)}))
+            continue
+        namespace = stats.setdefault(query_namespace(query), [0, 0.0])
+        namespace[0] += 1
+        namespace[1] += time.perf_counter() - start
+        out.append(json.dumps({"query": query, "pos": pos, "result": res}))
+    return out, stats
+
+
+def _init_worker(options):
+    _worker["ont"] = _open_ontology(options)
+
+
+def _answer_worker(lines):
+    return answer(_worker["ont"], lines)
+
+
+def _chunks(lines, size):
+    lines = iter(lines)
+    while True:
+        chunk = list(itertools.islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _merge(total, stats):
+    for namespace, (n, seconds) in stats.items():
+        t = total.setdefault(namespace, [0, 0.0])
+        t[0] += n
+        t[1] += seconds
+
+
+def run_query(options, lines, out, workers=1, chunksize=256):
+    """Answer JSONL query lines and write the results to out.  Returns the
+    merged {namespace: [queries, seconds]}."""
+    total = {}
+
+    def write(res):
+        res, stats = res
+        for line in res:
+            out.write(line + "\n")
+        _merge(total, stats)
+
+    # compiles the snapshot once before any worker needs it
+    ont = _open_ontology(options)
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(options,)) as pool:
+            pending = deque()
+            for chunk in _chunks(lines, chunksize):
+                pending.append(pool.apply_async(_answer_worker, (chunk,)))
+                if len(pending) >= 2 * workers:
+                    write(pending.popleft().get())
+            while pending:
+                write(pending.popleft().get())
+    else:
+        for chunk in _chunks(lines, chunksize):
+            write(answer(ont, chunk))
+    out.flush()
+    return total
+
+
+def report(stats, elapsed, err):
+    """write per-namespace throughput to err"""
+    err.write("{:<10} {:>10} {:>10} {:>12}\n".format("namespace", "queries", "seconds", "queries/s"))
+    for namespace in sorted(stats):
+        n, seconds = stats[namespace]
+        err.write("{:<10} {:>10} {:>10.3f} {:>12.1f}\n".format(
+            namespace, n, seconds, n / seconds if seconds else 0))
+    n = sum(s[0] for s in stats.values())
+    err.write("{:<10} {:>10} {:>10.3f} {:>12.1f}\n".format(
+        "total", n, elapsed, n / elapsed if elapsed else 0))
+
+
+def _query(args):
+    options = _options(args)
+    start = time.perf_counter()
+    if args.input == "-":
+        stats = run_query(options, sys.stdin, sys.stdout, workers=args.workers, chunksize=args.chunksize)
+    else:
+        with open(args.input) as lines:
+            stats = run_query(options, lines, sys.stdout, workers=args.workers, chunksize=args.chunksize)
+    if not args.quiet:
+        report(stats, time.perf_counter() - start, sys.stderr)
+    return 0
+
+
+def _compile(args):
+    from .snapshot import compile_ontology
+    ont = compile_ontology(path=args.path, skip_lexicon=args.skip_lexicon, use_gloss=args.gloss)
+    if args.shared:
+        from .shared import compile_shared
+        compile_shared(skip_lexicon=args.skip_lexicon, use_gloss=args.gloss, ont=ont)
+    return 0
+
+
+def _serve(args):
+    import asyncio
+    from .server import serve
+    options = _options(args)
+    ont = _open_ontology(options)
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(serve(ont, path=args.socket, host=args.host, port=args.port,
+                                      batch_size=args.batch_size, batch_delay=args.batch_delay))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
+    return 0
+
+
+def parser():
+    p = argparse.ArgumentParser(prog="pytrips", description="Query the TRIPS ontology and lexicon")
+    sub = p.add_subparsers(dest="command")
+    sub.required = True
+
+    def ontology_options(s):
+        s.add_argument("--gloss", action="store_true", help="use the gloss-derived ontology")
+        s.add_argument("--skip-lexicon", action="store_true", help="load the ontology without the lexicon")
+        s.add_argument("--shared", action="store_true", help="use the memory-mapped shared file")
+        s.add_argument("--persistent-cache", nargs="?", const=True, default=None, metavar="PATH",
+                       help="keep query results in an on-disk cache shared between processes")
+
+    q = sub.add_parser("query", help="answer JSONL queries")
+    q.add_argument("input", nargs="?", default="-", help="JSONL file, stdin if omitted or -")
+    q.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    q.add_argument("--chunksize", type=int, default=256, help="queries per chunk")
+    q.add_argument("--quiet", action="store_true", help="do not report throughput")
+    ontology_options(q)
+    q.set_defaults(func=_query)
+
+    c = sub.add_parser("compile", help="compile the ontology snapshot")
+    c.add_argument("--path", default=None, help="snapshot path, the cache directory by default")
+    ontology_options(c)
+    c.set_defaults(func=_compile)
+
+    s = sub.add_parser("serve", help="serve queries to local clients (see pytrips.server)")
+    where = s.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", default=None, help="unix socket path")
+    where.add_argument("--port", type=int, default=None, help="tcp port")
+    s.add_argument("--host", default="127.0.0.1", help="tcp host")
+    s.add_argument("--batch-size", type=int, default=64, help="most requests answered in one batch")
+    s.add_argument("--batch-delay", type=float, default=0.002,
+                   help="seconds a batch waits for more requests")
+    ontology_options(s)
+    s.set_defaults(func=_serve)
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    return args.func(args)
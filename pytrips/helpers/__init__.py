@@ -1,4 +1,5 @@
 from .helpers import get_wn_key, wn, all_hypernyms, all_hyponyms, ss_to_sk
+from .helpers import resolve_wn_keys, seed_wn_keys, clear_wn_key_cache
 from .helpers import Normalize
 import logging
 
@@ -1,5 +1,7 @@
 import sys
 import logging
+from collections import OrderedDict
+from functools import lru_cache
 
 log = logging.getLogger("pytrips.helpers")
 
@@ -26,20 +28,32 @@ def make_spacy_pos_table():
 spacy_pos_labels = make_spacy_pos_table()
 
 
-def get_wn_key(k):
-    if not wn:
-        log.info("wn not found when trying to lookup " + k)
-        return None
-    if not k:
-        return None
-    if type(k) is Synset:
-        return k
+# most synsets kept by each key cache
+KEY_CACHE_SIZE = 65536
+
+# normalized sense key -> synset (or _MISS if it does not resolve), least
+# recently used first
+_key_synsets = OrderedDict()
+_MISS = object()
+# normalized sense key -> (pos, offset) of the keys seeded from a snapshot,
+# None for the ones that do not resolve.  Only holds the ontology's keys.
+_key_offsets = {}
+
+
+def _normalize_wn_key(k):
     if k.startswith("wn::"):
         k = k[4:]
     while k.count(":") < 4:
         k += ":"
+    return k
+
+
+def _resolve_wn_key(k):
     if "%" not in k:
         return None
+    if k in _key_offsets:
+        offset = _key_offsets[k]
+        return offset and wn.synset_from_pos_and_offset(*offset)
     try:
         res = wn.lemma_from_key(k).synset()
         if not res:
@@ -49,11 +63,59 @@ def get_wn_key(k):
         log.info("no synset found for " + k)
         return None
 
+
+def get_wn_key(k):
+    """Resolve a sense key to its synset.  The most recently used keys are
+    cached by normalized key, including the ones that do not resolve, so
+    failed lookups are not retried."""
+    if not wn:
+        log.info("wn not found when trying to lookup " + k)
+        return None
+    if not k:
+        return None
+    if type(k) is Synset:
+        return k
+    norm = _normalize_wn_key(k)
+    res = _key_synsets.get(norm)
+    if res is not None:
+        _key_synsets.move_to_end(norm)
+        return None if res is _MISS else res
+    res = _resolve_wn_key(norm)
+    _key_synsets[norm] = _MISS if res is None else res
+    if len(_key_synsets) > KEY_CACHE_SIZE:
+        _key_synsets.popitem(last=False)
+    return res
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def _synset_key(ss):
+    return ss.lemmas()[0].key()
+
 def ss_to_sk(ss):
+    """The canonical sense key of a synset (the key of its first lemma)"""
     if type(ss) is Synset:
-        return ss.lemmas()[0].key()
+        return _synset_key(ss)
     return ss
 
+def resolve_wn_keys(keys):
+    """Resolve sense keys up front.  Returns {key: (pos, offset)}, with None
+    for keys that do not resolve, which seed_wn_keys accepts."""
+    res = {}
+    for k in keys:
+        ss = get_wn_key(k)
+        res[_normalize_wn_key(k)] = (ss.pos(), ss.offset()) if ss else None
+    return res
+
+def seed_wn_keys(offsets):
+    """Seed the key cache from the output of resolve_wn_keys.  Synsets are
+    only read from wordnet when a key is first used, by offset, which is much
+    cheaper than resolving the key again."""
+    _key_offsets.update(offsets)
+
+def clear_wn_key_cache():
+    _key_synsets.clear()
+    _key_offsets.clear()
+    _synset_key.cache_clear()
+
 class Normalize:
     @staticmethod
     def ont_name(name):
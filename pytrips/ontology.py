@@ -2,15 +2,19 @@ import logging
 logger = logging.getLogger("pytrips")
 
 import jsontrips
-from collections import defaultdict as ddict
+from collections import defaultdict as ddict, OrderedDict
+from itertools import chain
+import multiprocessing
 import json
+import os
 import sys
 
-from .structures import TripsRestriction, TripsType, TripsSem
-from .helpers import wn, get_wn_key, ss_to_sk, all_hypernyms
+from .structures import TripsRestriction, TripsRestrictionIndex, TripsType, TripsSem, TripsHierarchy, TripsSignificance, TripsFeatureIndex, TripsWordIndex
+from .helpers import wn, get_wn_key, ss_to_sk, all_hypernyms, resolve_wn_keys, seed_wn_keys
 from nltk.corpus.reader.wordnet import Synset
 import string as _string
 from .nodegraph import NodeGraph
+from .cache import QueryCache, PersistentCache, persistent_key, MISSING, DEFAULT_MAXSIZE
 
 import re
 
@@ -23,6 +27,21 @@ def _is_query_pair(x):
         return (type(x[0]) in set([str, TripsType])) and (type(x[1] == str))
     return False
 
+def _definition_references(definition):
+    """Yield the atoms of a definition that can name a type: the head of every
+    clause and the values of its keyword arguments, but not the keywords"""
+    if not definition:
+        return
+    for i, x in enumerate(definition):
+        if type(x) is list:
+            yield from _definition_references(x)
+        elif type(x) is str and i % 2 == 0 and not x.startswith("?"):
+            yield x.lower()
+
+def _pos_index():
+    # module level so that the word index can be pickled into a snapshot
+    return ddict(set)
+
 def load_json(ontology, lexicon, use_gloss=False, stop=[], go=[]):
     self = Trips(stop=stop, go=go)
     ontology = ontology.values() # used to be a list, now is a dict
@@ -30,9 +49,9 @@ def load_json(ontology, lexicon, use_gloss=False, stop=[], go=[]):
     self._data = {}
     self._data['root'] = TripsType("root", None, [], [], [], [], TripsSem(type_="root", ont=self), [], self)
     revwords = ddict(set)
-    self._words = ddict(lambda: ddict(set))
+    self._words = ddict(_pos_index)
     self._wordnet_index = ddict(list)
-    self.__definitions = ddict(list)
+    references = ddict(set)
     if lexicon:
         for word, entry_list in lexicon["words"].items():
             for entry in entry_list:
@@ -89,18 +108,65 @@ def load_json(ontology, lexicon, use_gloss=False, stop=[], go=[]):
             if k:
                 self._wordnet_index[k].append(t)
 
-        if t.definitions:
-            self.__definitions[json.dumps(t.definitions)].append(t.name)
+        for r in _definition_references(s.get('definitions', [])):
+            references[r].add(t.name)
+
+    # the word index is read-only from here on, tuples are much smaller than
+    # sets and plain dicts do not grow on lookups of unknown words
+    self._words = {pos: {word: tuple(sorted(sys.intern(n) for n in names))
+                         for word, names in words.items()}
+                   for pos, words in self._words.items()}
+
+    # only keep the atoms that actually name a type
+    self._definition_index = {r: tuple(sorted(n)) for r, n in references.items() if r in self._data}
+
+    self._hierarchy = TripsHierarchy.build({n: t.parent_name for n, t in self._data.items()})
+    for i, name in enumerate(self._hierarchy.names):
+        self._data[name]._set_id(i)
+    fltypes = {t.sem.type for t in self._data.values() if t.sem}
+    for t in self._data.values():
+        for r in t.arguments:
+            r.resolve(self._hierarchy.index, fltypes)
+    self.part_of_speech_index()
     return self
 
+def _attach_shared(path):
+    from .shared import SharedOntology
+    return SharedOntology(path).ontology
+
+# ontology of a lookup_many worker process
+_worker = {}
+
+def _init_lookup_worker(ont, use_stop):
+    _worker["ont"] = ont
+    _worker["use_stop"] = use_stop
+
+def _lookup_worker(queries):
+    # results go back as type names, pickling a type would pickle its ontology
+    res = _worker["ont"]._lookup_batch(queries, use_stop=_worker["use_stop"])
+    return [Trips.dump_result(r) for r in res]
+
 class Trips(object):
-    def __init__(self, stop=None, go=None):
+    def __init__(self, stop=None, go=None, cache_size=DEFAULT_MAXSIZE, cache_limits=None):
         self._data=None
         self._words=None
         self._wordnet_index=None
-        self.__definitions=None
+        self._hierarchy=None
+        self._definition_index=None
+        self._wordnet_table=None
+        self._wordnet_table_depth=None
+        self._wordnet_key_offsets=None
+        self._significance=None
+        self._feature_index=None
+        self._restriction_index=None
         self._all_words = None
-        self.__query_cache = {}
+        self._pos_index = None
+        self._word_index = None
+        self._closures = {}
+        self._persistent = None
+        self._shared_path = None
+        self._snapshot_key = None
+        self.__query_cache = QueryCache(maxsize=cache_size, limits=cache_limits)
         if stop:
             if not go:
                 go = []
@@ -110,38 +176,229 @@ class Trips(object):
             self.stop = []
             self.use_stop = False
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # the fuzzy word index is large and closures hold synsets, both are
+        # rebuilt on demand
+        state["_word_index"] = None
+        state["_closures"] = {}
+        return state
+
+    def __reduce_ex__(self, protocol):
+        if self._shared_path is None:
+            return super().__reduce_ex__(protocol)
+        # an attached ontology is mapped again from its file, only the
+        # caches are kept
+        return _attach_shared, (self._shared_path,), {
+            "_shared_path": self._shared_path,
+            "_persistent": self._persistent,
+            "_Trips__query_cache": self.__query_cache,
+        }
+
+    def __setstate__(self, state):
+        state.setdefault("_word_index", None)
+        state.setdefault("_closures", {})
+        state.setdefault("_persistent", None)
+        state.setdefault("_shared_path", None)
+        state.setdefault("_snapshot_key", None)
+        self.__dict__.update(state)
+        if self._wordnet_key_offsets and wn:
+            seed_wn_keys(self._wordnet_key_offsets)
+
+    @property
+    def cache(self):
+        """The QueryCache behind __getitem__, use it to resize, clear or
+        inspect hit rates"""
+        return self.__query_cache
+
+    @property
+    def persistent_cache(self):
+        """The PersistentCache behind the query cache, or None"""
+        return self._persistent
+
+    def persist_cache(self, path=None, version=None):
+        """Keep query and lookup results in the SQLite database at path
+        (queries.sqlite in the snapshot directory by default) as well as in
+        memory, so they are shared with other processes and kept between
+        runs.  Results are only shared between ontologies with the same
+        version, which defaults to the snapshot_key of the jsontrips version
+        and options this ontology was loaded with.  An ontology built some
+        other way has to be given a version that identifies it.  A path of
+        False turns the persistent cache off."""
+        if path is False:
+            self._persistent = None
+            return None
+        if version is None:
+            version = self._snapshot_key
+        if version is None:
+            raise ValueError("the version of this ontology is not known, pass one to persist_cache")
+        if path is None:
+            from .snapshot import snapshot_dir
+            path = os.path.join(snapshot_dir(), "queries.sqlite")
+        self._persistent = PersistentCache(self, path, version=version)
+        return self._persistent
+
     def get_trips_type(self, name):
         """Get the trips type associated with the name"""
         name = name.split("ont::")[-1].lower()
         return self._data.get(name, None)
 
-    def get_word(self, word, pos=None):
-        """Lookup all possible types for a word."""
+    def get_trips_type_by_id(self, id_):
+        """Get the trips type with the given hierarchy id"""
+        return self._data[self._hierarchy.names[id_]]
+
+    def significance(self):
+        """The TripsSignificance of the hierarchy, computed on first use"""
+        if self._significance is None:
+            types = [self._data[n] for n in self._hierarchy.names]
+            self._significance = TripsSignificance.build(
+                self._hierarchy,
+                lambda i, p: types[i].differs_semantically_from(types[p])
+            )
+        return self._significance
+
+    def feature_index(self):
+        """The TripsFeatureIndex of the semantic features, computed on first use"""
+        if self._feature_index is None:
+            self._feature_index = TripsFeatureIndex.build(
+                [self._data[n].sem for n in self._hierarchy.names]
+            )
+        return self._feature_index
+
+    def get_types_with_features(self, features, match="all", within=None):
+        """
+        Types whose semantic features match, ordered by hierarchy id.
+
+        features: {feature: value}, a list of values matches any of them
+        match: "all" for every constraint, "any" for at least one
+        within: restrict the result to a type and its descendants
+        (eg. get_types_with_features({"mobility": "movable"}, within="phys-obj"))
+        """
+        index = self.feature_index()
+        mask = None
+        if within is not None:
+            if type(within) is not TripsType:
+                within = self.get_trips_type(within)
+                if within is None:
+                    return []
+            mask = index.subtree_mask(self._hierarchy, within.id)
+        bits = index.query(features, match=match, within=mask)
+        return [self.get_trips_type_by_id(i) for i in index.ids(bits)]
+
+    def restriction_index(self):
+        """The TripsRestrictionIndex of every argument, computed on first use"""
+        if self._restriction_index is None:
+            self._restriction_index = TripsRestrictionIndex.build(
+                [self._data[n] for n in self._hierarchy.names]
+            )
+        return self._restriction_index
+
+    def _as_type(self, t):
+        if type(t) is TripsType:
+            return t
+        return self.get_trips_type(t)
+
+    def satisfies(self, filler, type_, role):
+        """true if filler meets the restriction on role of type_.  Types can
+        be TripsTypes or names, the role can be given with or without the
+        leading colon."""
+        filler = self._as_type(filler)
+        type_ = self._as_type(type_)
+        if filler is None or type_ is None:
+            return False
+        role = role.lstrip(":").lower()
+        return any(r.satisfied_by(filler) for r in type_.arguments if r.role == role)
+
+    def accepting_slots(self, filler):
+        """(type, role) of every argument whose restriction filler meets"""
+        filler = self._as_type(filler)
+        if filler is None:
+            return []
+        slots = self.restriction_index().accepting(self._hierarchy, filler)
+        return [(self.get_trips_type_by_id(i), role) for i, role in slots]
+
+    def get_word(self, word, pos=None, fuzzy=0):
+        """Lookup all possible types for a word.  If fuzzy is not 0, the
+        closest words in the lexicon within that edit distance are looked up
+        instead (see closest_words)."""
         word = word.split("w::")[-1].lower()
+        if fuzzy:
+            res = []
+            for w in self.closest_words(word, fuzzy, pos=pos):
+                res.extend(t for t in self.get_word(w, pos=pos) if t not in res)
+            return res
         if pos:
-            index = self._words[pos][word]
+            index = self._words.get(pos, {}).get(word, ())
         else:
             index = set()
-            for pos, words in self._words.items():
-                index.update(words[word])
+            for words in self._words.values():
+                index.update(words.get(word, ()))
+            index = sorted(index)
         return [self[x] for x in index if self[x]]
 
     @property
     def all_words(self):
-        if not self._all_words:
-            self._all_words = sum([list(self._words[p]) for p in self._words], [])
+        """every word in the lexicon, once per part of speech it has"""
+        if self._all_words is None:
+            self._all_words = tuple(chain.from_iterable(self._words.values()))
         return self._all_words
 
+    def part_of_speech_index(self):
+        """{pos: (words, type names)}, both sorted tuples, computed on first use"""
+        if self._pos_index is None:
+            index = {}
+            for pos, words in self._words.items():
+                names = set()
+                for n in words.values():
+                    names.update(n)
+                index[pos] = (tuple(sorted(words)), tuple(sorted(n for n in names if n in self._data)))
+            self._pos_index = index
+        return self._pos_index
+
+    def word_index(self, max_distance=1):
+        """The TripsWordIndex of the lexicon and wordnet lemmas, built on
+        first use and rebuilt if a larger max_distance is needed.  Building
+        it takes a few seconds (about 130MB at distance 2) so it is not
+        kept in pickles."""
+        if self._word_index is None or self._word_index.max_distance < max_distance:
+            words = set(self.all_words)
+            if wn:
+                words.update(wn.all_lemma_names())
+            self._word_index = TripsWordIndex(words, max_distance=max_distance)
+        return self._word_index
+
+    def complete(self, prefix, limit=10):
+        """words of the lexicon or wordnet starting with prefix"""
+        return self.word_index().complete(prefix.split("w::")[-1], limit=limit)
+
+    def closest_words(self, word, distance=1, pos=None, wordnet=False):
+        """The words within distance edits of word that are nearest to it,
+        among the words in the lexicon (for pos if given) or, if wordnet is
+        true, the words with wordnet lemmas.  The word itself if it is
+        known."""
+        def known(w):
+            if pos:
+                if w in self._words.get(pos, {}):
+                    return True
+            elif any(w in words for words in self._words.values()):
+                return True
+            return bool(wordnet and wn and wn.lemmas(w, pos=pos))
+        res = []
+        for w, d in self.word_index(distance).fuzzy(word, distance):
+            if res and d > res[0][1]:
+                break
+            if known(w):
+                res.append((w, d))
+        return [w for w, _ in res]
+
     def get_part_of_speech(self, pos, lex):
-        """Lookup all possible types or lexical items for the given part of speech"""
+        """Lookup all possible types or lexical items for the given part of
+        speech, as a tuple"""
         pos = pos.split("p::")[-1]
-        words = self._words[pos].keys()
+        words, names = self.part_of_speech_index().get(pos, ((), ()))
         if lex:
             return words
-        res = []
-        for x in words:
-            res += self.get_word(x, pos=pos)
-        return list(set(res))
+        return tuple(self._data[n] for n in names)
 
     def get_word_graph(self, word, pos=None, use_stop=None):
         if use_stop is None:
@@ -186,6 +443,9 @@ class Trips(object):
         if not key:
             return _return([])
 
+        if not graph and max_depth == self._wordnet_table_depth:
+            return [self._data[n] for n in self._wordnet_table.get(key.name(), ())]
+
         if graph:
             graph.node(key)
             if parent:
@@ -212,12 +472,80 @@ class Trips(object):
                 res.update(n)
         return _return(res)
 
-    def lookup(self, word, pos, use_stop=None):
-        """pos should be one of "n" (noun) "v" (verb), "a" (adjective), "r" (adverb), "s" (satellite)"""
+    def resolve_wordnet_keys(self):
+        """Resolve every sense key used by the ontology to its synset.  The
+        resolved offsets are kept so that an unpickled ontology can seed the
+        sense key cache without asking wordnet again."""
+        if not wn:
+            return None
+        self._wordnet_key_offsets = resolve_wn_keys(self._wordnet_index.keys())
+        return self._wordnet_key_offsets
+
+    def build_wordnet_table(self, max_depth=-1):
+        """Resolve every wordnet synset to its trips types once and keep the
+        result for get_wordnet.  Hypernym walks are memoized on (synset,
+        remaining depth), so ancestors shared between synsets are only
+        resolved once.  The table holds type names keyed by synset name and
+        only answers lookups made with the same max_depth."""
+        if not wn:
+            return None
+        if max_depth == -1:
+            max_depth = self.max_wn_depth
+        memo = {}
+
+        def resolve(key, depth):
+            if depth == 0:
+                return ()
+            res = memo.get((key, depth))
+            if res is not None:
+                return res
+            sk = ss_to_sk(key)
+            if sk in self._wordnet_index:
+                res = tuple(t.name for t in self._wordnet_index[sk])
+            else:
+                names = set()
+                for k, _ in all_hypernyms(key):
+                    names.update(resolve(k, depth - 1))
+                res = tuple(sorted(names))
+            memo[(key, depth)] = res
+            return res
+
+        table = {}
+        for key in wn.all_synsets():
+            res = resolve(key, max_depth)
+            if res:
+                table[key.name()] = res
+        self._wordnet_table = table
+        self._wordnet_table_depth = max_depth
+        return table
+
+    def lookup(self, word, pos, use_stop=None, fuzzy=0):
+        """pos should be one of "n" (noun) "v" (verb), "a" (adjective), "r" (adverb), "s" (satellite)
+        If fuzzy is not 0, the closest known words within that edit distance
+        are looked up instead and their results merged."""
         #TODO what kind of information does this need in general?
+        if not fuzzy:
+            return self._lookup(word, pos, use_stop, self.get_wordnet)
+        res = {"lex": [], "wn": []}
+        for w in self.closest_words(word.split("q::")[-1].lower(), fuzzy, pos=pos, wordnet=True):
+            for k, v in self._lookup(w, pos, use_stop, self.get_wordnet).items():
+                res[k].extend(t for t in v if t not in res[k])
+        return res
+
+    def _lookup(self, word, pos, use_stop, get_wordnet):
         if use_stop is None:
             use_stop = self.use_stop
         word = word.split("q::")[-1]
+        if self._persistent is not None:
+            key = json.dumps(["q::" + word, pos, bool(use_stop)])
+            res = self._persistent.get(key)
+            if res is MISSING:
+                res = self.__lookup(word, pos, use_stop, get_wordnet)
+                self._persistent.put(key, res)
+            return res
+        return self.__lookup(word, pos, use_stop, get_wordnet)
+
+    def __lookup(self, word, pos, use_stop, get_wordnet):
         #1 get word lookup
         w_look = self.get_word(word, pos=pos)
         #2 get wordnet
@@ -228,14 +556,87 @@ class Trips(object):
                 keys = [s for s in keys if s.key().lower() not in self.stop]
             keys = [s.synset() for s in keys]
             for k in keys:
-                wnlook.update(self.get_wordnet(k))
-        return {"lex" : w_look, "wn": list(wnlook)}
-
-    def get_definition(self, name):
-        """Get types that contain the given name in their definitions
+                wnlook.update(get_wordnet(k))
+        return {"lex" : w_look, "wn": sorted(wnlook, key=lambda t: t.name)}
+
+    def _lookup_batch(self, queries, use_stop=None):
+        """lookup unique (word, pos) pairs, resolving each synset once"""
+        synsets = {}
+        def get_wordnet(key):
+            if key not in synsets:
+                synsets[key] = self.get_wordnet(key)
+            return synsets[key]
+        return [self._lookup(word, pos, use_stop, get_wordnet) for word, pos in queries]
+
+    def lookup_many(self, queries, use_stop=None, workers=None, chunksize=256):
+        """Lookup an iterable of (word, pos) pairs.  Returns the lookup results
+        in input order.  Each distinct pair is only looked up once and synsets
+        shared between words are only resolved once.  If workers is set, the
+        distinct pairs are split into chunks of chunksize and looked up in a
+        pool of that many processes, each of which starts from this ontology.
+        """
+        queries = [(word.split("q::")[-1], pos) for word, pos in queries]
+        unique = list(OrderedDict.fromkeys(queries))
+        if workers and len(unique) > chunksize:
+            chunks = [unique[i:i+chunksize] for i in range(0, len(unique), chunksize)]
+            with multiprocessing.Pool(workers, initializer=_init_lookup_worker, initargs=(self, use_stop)) as pool:
+                results = [self._load_lookup(r) for chunk in pool.imap(_lookup_worker, chunks) for r in chunk]
+        else:
+            results = self._lookup_batch(unique, use_stop=use_stop)
+        results = dict(zip(unique, results))
+        return [{"lex": list(results[q]["lex"]), "wn": list(results[q]["wn"])} for q in queries]
+
+    def _load_lookup(self, res):
+        """rebuild a lookup result from the type names sent back by a worker"""
+        return {k: list(v) for k, v in self.load_result(res).items()}
+
+    @staticmethod
+    def dump_result(res):
+        """A query result in plain json types: types become "ont::name"
+        strings, lists and tuples become lists."""
+        if type(res) is TripsType:
+            return str(res)
+        elif type(res) is dict:
+            return {k: Trips.dump_result(v) for k, v in res.items()}
+        elif type(res) in (list, tuple):
+            return [Trips.dump_result(x) for x in res]
+        return res
+
+    def load_result(self, res):
+        """Inverse of dump_result: "ont::name" strings become types of this
+        ontology and lists become tuples."""
+        if type(res) is str:
+            if res.startswith("ont::"):
+                return self.get_trips_type(res) or res
+            return res
+        elif type(res) is dict:
+            return {k: self.load_result(v) for k, v in res.items()}
+        elif type(res) is list:
+            return tuple(self.load_result(x) for x in res)
+        return res
+
+    def similarity_matrix(self, a, b, metric="wup"):
+        """numpy matrix of "wup", "cosine" or "path_len" scores between every
+        type in a and every type in b.  Requires numpy."""
+        from .similarity.metrics import similarity_matrix
+        return similarity_matrix(self, a, b, metric=metric)
+
+    def get_definition(self, name, descendants=False):
+        """Get types whose definitions reference the given type.  If
+        descendants is set, also get types whose definitions reference any of
+        its subtypes.
         """
-        name = name.split("d::")[-1].split("ont::")[-1].upper() #definitions are in uppercase, names are in lower case.
-        return list(set(["ont::"+df for lst in self.__definitions.keys() for df in self.__definitions[lst] if ""+name+"" in lst]))
+        name = name.split("d::")[-1].split("ont::")[-1].lower()
+        if not descendants:
+            return ["ont::"+df for df in self._definition_index.get(name, ())]
+        t = self.get_trips_type(name)
+        if not t:
+            return []
+        names = self._hierarchy.names
+        res = set()
+        for i in self._hierarchy.subtree(t.id):
+            res.update(self._definition_index.get(names[i], ()))
+        return ["ont::"+df for df in sorted(res)]
 
     def __getitem__(self, key):
         """if the input is "w::x" lookup x as a word
@@ -243,9 +644,17 @@ class Trips(object):
         if the input is "wn::x" lookup x as a wordnet sense
         else lookup as an ont type.
         """
-        if key not in self.__query_cache:
-            self.__query_cache[key] = self.make_query(key)
-        return self.__query_cache[key]
+        res = self.__query_cache.get(key)
+        if res is MISSING:
+            stored = self._persistent is not None and persistent_key(key)
+            if stored:
+                res = self._persistent.get(stored)
+            if res is MISSING:
+                res = self.make_query(key)
+                if stored:
+                    self._persistent.put(stored, res)
+            self.__query_cache.put(key, res)
+        return res
 
     def make_query(self, key):
         pos = None
@@ -276,10 +685,12 @@ class Trips(object):
     def __iter__(self):
         """return an iterator with all the types."""
         # TODO: guarantee order
-        return self._data.values()
+        return iter(self._data.values())
 
 
 def load(skip_lexicon=False, use_gloss=False, log=False):
+    """Build the ontology from the json files shipped with jsontrips.
+    This is slow, prefer get_ontology which reuses a compiled snapshot."""
     if not log:
         logging.disable(logging.CRITICAL)
     if use_gloss:
@@ -300,14 +711,29 @@ def load(skip_lexicon=False, use_gloss=False, log=False):
         lex = jsontrips.lexicon()
 
     logger.info("Loaded lexicon")
-    return load_json(ont, lex, use_gloss=use_gloss, stop=jsontrips.stoplist(), go=jsontrips.golist())
+    from .snapshot import snapshot_key
+    res = load_json(ont, lex, use_gloss=use_gloss, stop=jsontrips.stoplist(), go=jsontrips.golist())
+    res._snapshot_key = snapshot_key(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    return res
 
 __ontology__ = {}
 
-def get_ontology(skip_lexicon=False, use_gloss=False, single=False, log=False):
+def get_ontology(skip_lexicon=False, use_gloss=False, single=False, log=False, snapshot=True,
+                 persistent_cache=None):
+    """Get a shared ontology instance.  If snapshot is set, the ontology is
+    read from a compiled snapshot (see pytrips.snapshot) and the snapshot is
+    (re)built when it is missing or stale.  If persistent_cache is True or
+    a path, query results are also kept on disk (see Trips.persist_cache)."""
     global __ontology__
     if not __ontology__.get(use_gloss):
-        __ontology__[use_gloss] = load(skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+        if snapshot:
+            from .snapshot import load_snapshot
+            ont = load_snapshot(skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+        else:
+            ont = load(skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+        if persistent_cache:
+            ont.persist_cache(None if persistent_cache is True else persistent_cache)
+        __ontology__[use_gloss] = ont
         if single:
             __ontology__[not use_gloss] = __ontology__[use_gloss]
     return __ontology__[use_gloss]
@@ -0,0 +1,298 @@
+"""
+A local query server, so that one loaded ontology can serve every process
+on a host.
+
+The protocol is newline delimited json over a unix socket or a localhost
+tcp port.  A request is {"id": ..., "op": ..., "args": {...}} and the reply
+{"id": ..., "result": ...} or {"id": ..., "error": ...}, results are in the
+form of Trips.dump_result.  Operations:
+
+    query       {"query": "w::cat", "pos": "n"}       ont[query]
+    lookup      {"word": "cat", "pos": "n"}           ont.lookup
+    subsumes    {"a": "food", "b": "bread"}           a subsumes b
+                (optional "max_depth", "significant")
+    similarity  {"a": "food", "b": "bread", "metric": "wup"}
+                (metric is "wup", "cosine" or "path_len")
+
+Requests from all connections are collected into micro-batches.  A request
+identical to one that is queued or being answered shares its result, and
+the lookups of a batch share their wordnet walks (see Trips.lookup_many).
+Batches are answered on a single thread, so the ontology is never used
+concurrently.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import itertools
+import json
+
+from .ontology import Trips
+
+_metrics = ("wup", "cosine", "path_len")
+# errors of a single request, reported to its client
+_errors = (ValueError, KeyError, TypeError, AttributeError, ZeroDivisionError)
+
+
+def _key(op, args):
+    return op, json.dumps(args, sort_keys=True)
+
+
+class TripsServer(object):
+    """
+    Serve ont to local clients, see the module documentation for the
+    protocol.  batch_delay is how long (in seconds) a batch waits for more
+    requests after its first one, batch_size caps its length.  stats counts
+    "requests", "coalesced" (requests that shared an in-flight result),
+    "batches" and "answered".
+    """
+
+    def __init__(self, ont, batch_size=64, batch_delay=0.002):
+        self.ont = ont
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.stats = Counter()
+        self._inflight = {}
+        self._queue = None
+        self._batcher = None
+        self._server = None
+        self._handlers = set()
+        self._executor = ThreadPoolExecutor(1)
+
+    async def start(self, path=None, host="127.0.0.1", port=None):
+        """listen on the unix socket path if given, else on host:port"""
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._batches())
+        if path:
+            self._server = await asyncio.start_unix_server(self._connected, path=path)
+        else:
+            self._server = await asyncio.start_server(self._connected, host, port)
+        return self._server
+
+    async def close(self):
+        """stop listening and drop open connections"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        tasks = list(self._handlers)
+        if self._batcher is not None:
+            tasks.append(self._batcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    def _connected(self, reader, writer):
+        task = asyncio.ensure_future(self._handle(reader, writer))
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+
+    def submit(self, op, args):
+        """future of the json result of a request"""
+        if type(op) is not str or type(args) is not dict:
+            raise TypeError("op must be a string and args an object")
+        self.stats["requests"] += 1
+        key = _key(op, args)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return future
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[key] = future
+        self._queue.put_nowait((key, op, args, future))
+        return future
+
+    async def _batches(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_delay:
+                await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.stats["batches"] += 1
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.answer, [(op, args) for _, op, args, _ in batch])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # fail this batch, keep serving the next ones
+                results = [(False, "{}: {}".format(type(e).__name__, e))] * len(batch)
+            for (key, _, _, future), (ok, value) in zip(batch, results):
+                self._inflight.pop(key, None)
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(ValueError(value))
+
+    def answer(self, requests):
+        """(ok, json result or error message) for every (op, args)"""
+        self.stats["answered"] += len(requests)
+        res = [None] * len(requests)
+        lookups = []
+        for i, (op, args) in enumerate(requests):
+            if op == "lookup" and not args.get("fuzzy"):
+                lookups.append(i)
+                continue
+            res[i] = self._try(op, args)
+        if lookups:
+            try:
+                found = self.ont._lookup_batch([(requests[i][1]["word"], requests[i][1].get("pos"))
+                                                for i in lookups])
+                for i, r in zip(lookups, found):
+                    res[i] = (True, Trips.dump_result(r))
+            except _errors:
+                # find out which ones failed
+                for i in lookups:
+                    res[i] = self._try(*requests[i])
+        return res
+
+    def _try(self, op, args):
+        try:
+            return True, self._answer(op, args)
+        except _errors as e:
+            return False, "{}: {}".format(type(e).__name__, e)
+
+    def _type(self, name):
+        t = self.ont.get_trips_type(name)
+        if t is None:
+            raise ValueError("unknown type: {}".format(name))
+        return t
+
+    def _answer(self, op, args):
+        ont = self.ont
+        if op == "query":
+            pos = args.get("pos")
+            query = args["query"]
+            return Trips.dump_result(ont[(query, pos) if pos else query])
+        elif op == "lookup":
+            return Trips.dump_result(ont.lookup(args["word"], args.get("pos"), fuzzy=args.get("fuzzy", 0)))
+        elif op == "subsumes":
+            return self._type(args["a"]).subsumes(
+                self._type(args["b"]),
+                max_depth=args.get("max_depth", -1),
+                significant=args.get("significant", False)
+            )
+        elif op == "similarity":
+            metric = args.get("metric", "wup")
+            if metric not in _metrics:
+                raise ValueError("unknown metric: {}".format(metric))
+            return getattr(self._type(args["a"]), metric)(self._type(args["b"]))
+        raise ValueError("unknown op: {}".format(op))
+
+    async def _reply(self, writer, id_, future):
+        try:
+            reply = {"id": id_, "result": await future}
+        except ValueError as e:
+            reply = {"id": id_, "error": str(e)}
+        writer.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+    async def _handle(self, reader, writer):
+        replies = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                id_ = None
+                try:
+                    request = json.loads(line)
+                    if type(request) is not dict:
+                        raise TypeError("a request must be an object")
+                    id_ = request.get("id")
+                    future = self.submit(request["op"], request.get("args", {}))
+                except (ValueError, KeyError, TypeError) as e:
+                    writer.write((json.dumps({"id": id_, "error": str(e)}) + "\n").encode("utf-8"))
+                    continue
+                replies.append(asyncio.ensure_future(self._reply(writer, id_, future)))
+                replies = [r for r in replies if not r.done()]
+            if replies:
+                await asyncio.gather(*replies)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(ont, path=None, host="127.0.0.1", port=None, **kwargs):
+    """Serve ont until cancelled"""
+    server = TripsServer(ont, **kwargs)
+    await server.start(path=path, host=host, port=port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+class TripsClient(object):
+    """
+    Async client of a TripsServer.  Requests can be issued concurrently
+    over one connection, results are in the json form of Trips.dump_result
+    (Trips.load_result turns them back into types of a local ontology).
+
+        client = await TripsClient.connect(path="/tmp/pytrips.sock")
+        await client.query("w::cat")
+        await client.close()
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._pending = {}
+        self._listener = asyncio.ensure_future(self._listen())
+
+    @classmethod
+    async def connect(cls, path=None, host="127.0.0.1", port=None):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _listen(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self._pending.pop(reply.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in reply:
+                    future.set_exception(ValueError(reply["error"]))
+                else:
+                    future.set_result(reply["result"])
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection to the server closed"))
+
+    async def request(self, op, **args):
+        id_ = next(self._ids)
+        future = asyncio.get_event_loop().create_future()
+        self._pending[id_] = future
+        self._writer.write((json.dumps({"id": id_, "op": op, "args": args}) + "\n").encode("utf-8"))
+        await self._writer.drain()
+        return await future
+
+    async def query(self, query, pos=None):
+        return await self.request("query", query=query, pos=pos)
+
+    async def lookup(self, word, pos=None, fuzzy=0):
+        return await self.request("lookup", word=word, pos=pos, fuzzy=fuzzy)
+
+    async def subsumes(self, a, b, max_depth=-1, significant=False):
+        return await self.request("subsumes", a=a, b=b, max_depth=max_depth, significant=significant)
+
+    async def similarity(self, a, b, metric="wup"):
+        return await self.request("similarity", a=a, b=b, metric=metric)
+
+    async def close(self):
+        self._writer.close()
+        self._listener.cancel()
+        await asyncio.gather(self._listener, return_exceptions=True)
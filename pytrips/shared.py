@@ -0,0 +1,541 @@
+"""
+Read-only, memory-mapped ontology for multi-process deployments.
+
+write_shared lays a loaded ontology out as flat arrays and sorted string
+tables in a single file: the hierarchy arrays, the lexicon index, the
+wordnet index, the wordnet table, the definition index and one pickled
+record per type.  attach maps the file and returns a Trips instance that
+reads all of these straight from the mapping.  The pages belong to the
+page cache and are never written, so any number of worker processes share
+one copy.  Types are only unpickled when a process touches them, and only
+those are private to the process.
+
+    from pytrips.shared import compile_shared, attach
+    compile_shared()   # once, e.g. when building the image
+    ont = attach()     # in every worker
+"""
+import bisect
+import io
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from array import array
+from collections.abc import Mapping, Sequence
+
+from .ontology import Trips
+from .structures import TripsHierarchy, TripsSignificance, TripsFeatureIndex, TripsRestrictionIndex
+from .helpers import wn
+from .snapshot import snapshot_key, snapshot_dir, build
+
+from nltk.corpus.reader.wordnet import Synset
+
+logger = logging.getLogger("pytrips.shared")
+
+MAGIC = b"PYTRIPS\x01"
+_ALIGN = 8
+
+
+class _StringTable(Sequence):
+    """strings stored back to back, offsets[i]:offsets[i+1] is string i"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.blob[self.offsets[i]:self.offsets[i+1]], "utf-8")
+
+
+class _SortedIndex(Mapping):
+    """sorted string keys, each with a run of int ids"""
+
+    def __init__(self, keys, value_offsets, values):
+        self.keys_ = keys
+        self.value_offsets = value_offsets
+        self.values_ = values
+
+    def find(self, key):
+        i = bisect.bisect_left(self.keys_, key)
+        if i < len(self.keys_) and self.keys_[i] == key:
+            return i
+        return -1
+
+    def ids(self, i):
+        return self.values_[self.value_offsets[i]:self.value_offsets[i+1]]
+
+    def prefix_range(self, prefix):
+        """positions of all keys starting with prefix"""
+        lo = bisect.bisect_left(self.keys_, prefix)
+        hi = bisect.bisect_left(self.keys_, prefix + "\U0010ffff")
+        return range(lo, hi)
+
+    def __getitem__(self, key):
+        i = self.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.ids(i)
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+
+class SharedTypes(Mapping):
+    """name -> TripsType, types are unpickled from their records on first use"""
+
+    def __init__(self, ont, names, index, records):
+        self._ont = ont
+        self._names = names
+        self._index = index
+        self._records = records
+        self._types = {}
+
+    def by_id(self, i):
+        t = self._types.get(i)
+        if t is None:
+            t = self._types[i] = self._records.load(i, self._ont)
+        return t
+
+    def __getitem__(self, name):
+        i = self._index.find(name)
+        if i < 0:
+            raise KeyError(name)
+        return self.by_id(self._index.ids(i)[0])
+
+    def __contains__(self, name):
+        return self._index.find(name) >= 0
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def values(self):
+        return [self.by_id(i) for i in range(len(self._names))]
+
+
+class _Records(object):
+    """one pickled TripsType per id, references to the ontology and to
+    synsets are stored by name"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def load(self, i, ont):
+        data = self.blob[self.offsets[i]:self.offsets[i+1]]
+        unpickler = pickle.Unpickler(io.BytesIO(data))
+        unpickler.persistent_load = lambda pid: ont if pid == "ont" else wn.synset(pid[1])
+        return unpickler.load()
+
+
+class SharedWords(Mapping):
+    """pos -> word -> sorted tuple of type names, read from "pos\\tword"
+    keys.  Unknown parts of speech read as empty."""
+
+    def __init__(self, index, names, pos):
+        self._index = index
+        self._names = names
+        self._pos = pos
+
+    def __getitem__(self, pos):
+        return _SharedPosWords(self._index, self._names, pos)
+
+    def __iter__(self):
+        return iter(self._pos)
+
+    def __len__(self):
+        return len(self._pos)
+
+
+class _SharedPosWords(Mapping):
+    def __init__(self, index, names, pos):
+        self._index = index
+        self._names = names
+        self._pos = pos
+        self._range = index.prefix_range(pos + "\t")
+
+    def __getitem__(self, word):
+        i = self._index.find(self._pos + "\t" + word)
+        if i < 0:
+            raise KeyError(word)
+        # ids are stored in name order
+        return tuple(self._names[j] for j in self._index.ids(i))
+
+    def __contains__(self, word):
+        return self._index.find(self._pos + "\t" + word) >= 0
+
+    def __iter__(self):
+        prefix = len(self._pos) + 1
+        return (self._index.keys_[i][prefix:] for i in self._range)
+
+    def __len__(self):
+        return len(self._range)
+
+
+class _SharedFeatureBits(Mapping):
+    """(feature, value) -> bitset of type ids, built from the sorted ids on
+    first use"""
+
+    def __init__(self, index, size):
+        self._index = index
+        self._size = size
+        self._bits = {}
+
+    def __getitem__(self, key):
+        res = self._bits.get(key)
+        if res is None:
+            ids = self._index["\t".join(key)]
+            bitmap = bytearray((self._size + 7) // 8)
+            for i in ids:
+                bitmap[i >> 3] |= 1 << (i & 7)
+            res = self._bits[key] = int.from_bytes(bytes(bitmap), "little")
+        return res
+
+    def __iter__(self):
+        return (tuple(k.split("\t", 1)) for k in self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class _SharedTypeIndex(Mapping):
+    """key -> list of TripsType"""
+
+    def __init__(self, index, types):
+        self._index = index
+        self._types = types
+
+    def __getitem__(self, key):
+        i = self._index.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return [self._types.by_id(j) for j in self._index.ids(i)]
+
+    def __contains__(self, key):
+        return self._index.find(key) >= 0
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class _SharedNameIndex(Mapping):
+    """key -> tuple of type names"""
+
+    def __init__(self, index, names):
+        self._index = index
+        self._names = names
+
+    def __getitem__(self, key):
+        i = self._index.find(key)
+        if i < 0:
+            raise KeyError(key)
+        return tuple(self._names[j] for j in self._index.ids(i))
+
+    def __contains__(self, key):
+        return self._index.find(key) >= 0
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class _Writer(object):
+    def __init__(self):
+        self.sections = {}
+        self.chunks = []
+        self.size = 0
+
+    def add(self, name, data, typecode="B"):
+        if type(data) is array:
+            typecode = data.typecode
+            data = data.tobytes()
+        pad = -self.size % _ALIGN
+        if pad:
+            self.chunks.append(b"\0" * pad)
+            self.size += pad
+        self.sections[name] = [self.size, len(data), typecode]
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def add_strings(self, name, strings):
+        offsets = array('q', [0])
+        blob = []
+        for s in strings:
+            b = s.encode("utf-8")
+            blob.append(b)
+            offsets.append(offsets[-1] + len(b))
+        self.add(name + ".offsets", offsets)
+        self.add(name + ".blob", b"".join(blob))
+
+    def add_index(self, name, mapping):
+        """mapping is key -> iterable of ids"""
+        keys = sorted(mapping)
+        self.add_strings(name + ".keys", keys)
+        offsets = array('q', [0])
+        values = array('i')
+        for k in keys:
+            values.extend(mapping[k])
+            offsets.append(len(values))
+        self.add(name + ".value_offsets", offsets)
+        self.add(name + ".values", values)
+
+
+def _dump_type(t, ont):
+    out = io.BytesIO()
+    pickler = pickle.Pickler(out, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def persistent_id(obj):
+        if obj is ont:
+            return "ont"
+        if type(obj) is Synset:
+            return ("synset", obj.name())
+        return None
+    pickler.persistent_id = persistent_id
+    pickler.dump(t)
+    return out.getvalue()
+
+
+def write_shared(ont, path, skip_lexicon=False, use_gloss=False):
+    """Lay ont out in the shared format at path"""
+    h = ont._hierarchy
+    index = h.index
+    ids = lambda names: [index[n] for n in names if n in index]
+    w = _Writer()
+    w.add("parent", array('i', h.parent))
+    w.add("depth", array('i', h.depth))
+    w.add("last", array('i', h.last))
+    for k, level in enumerate(h.up):
+        w.add("up%d" % k, array('i', level))
+    w.add_strings("names", h.names)
+    w.add_index("types", {n: [i] for i, n in enumerate(h.names)})
+    w.add_index("words", {"{}\t{}".format(p, word): ids(sorted(names))
+                          for p, words in ont._words.items() for word, names in words.items()})
+    w.add_index("wordnet_index", {k: [t.id for t in v] for k, v in ont._wordnet_index.items()})
+    w.add_index("definitions", {k: ids(v) for k, v in (ont._definition_index or {}).items()})
+    if ont._wordnet_table is not None:
+        w.add_index("wordnet_table", {k: ids(v) for k, v in ont._wordnet_table.items()})
+
+    # the indexes that would otherwise need every type to be rebuilt
+    significance = ont.significance()
+    w.add("significance.flag", array('b', significance.flag))
+    w.add("significance.significant", array('i', significance.significant))
+    w.add("significance.level", array('i', significance.level))
+    features = ont.feature_index()
+    w.add_index("features", {f + "\t" + v: features.ids(bits) for (f, v), bits in features.bits.items()})
+    restrictions = ont.restriction_index()
+    for name in TripsRestrictionIndex.arrays:
+        w.add("restrictions." + name, getattr(restrictions, name))
+
+    offsets = array('q', [0])
+    records = []
+    for name in h.names:
+        r = _dump_type(ont._data[name], ont)
+        records.append(r)
+        offsets.append(offsets[-1] + len(r))
+    w.add("records.offsets", offsets)
+    w.add("records.blob", b"".join(records))
+
+    header = json.dumps({
+        "key": snapshot_key(skip_lexicon=skip_lexicon, use_gloss=use_gloss),
+        "stop": ont.stop,
+        "use_stop": ont.use_stop,
+        "max_wn_depth": ont.max_wn_depth,
+        "wordnet_table_depth": ont._wordnet_table_depth,
+        "uplevels": len(h.up),
+        "pos": sorted(ont._words),
+        "restrictions": {
+            "roles": restrictions.roles,
+            "fltypes": restrictions.fltypes,
+            "constraints": restrictions.constraints,
+        },
+        "sections": w.sections,
+    }).encode("utf-8")
+    start = len(MAGIC) + 8 + len(header)
+    start += -start % _ALIGN
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".pytrips-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(MAGIC)
+            out.write(struct.pack("<q", len(header)))
+            out.write(header)
+            out.write(b"\0" * (start - out.tell()))
+            for chunk in w.chunks:
+                out.write(chunk)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def _read_header(path):
+    with open(path, "rb") as inp:
+        if inp.read(len(MAGIC)) != MAGIC:
+            return None, 0
+        length, = struct.unpack("<q", inp.read(8))
+        header = json.loads(inp.read(length).decode("utf-8"))
+    start = len(MAGIC) + 8 + length
+    return header, start + (-start % _ALIGN)
+
+
+class SharedOntology(object):
+    """A mapped shared ontology file.  ontology is the attached Trips."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header, start = _read_header(path)
+        if self.header is None:
+            raise ValueError("{} is not a shared ontology".format(path))
+        with open(path, "rb") as inp:
+            self._map = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self._start = start
+        self.ontology = self._attach()
+
+    def section(self, name):
+        offset, length, typecode = self.header["sections"][name]
+        offset += self._start
+        view = self._view[offset:offset+length]
+        if typecode == "B":
+            return view
+        return view.cast(typecode)
+
+    def strings(self, name):
+        return _StringTable(self.section(name + ".offsets"), self.section(name + ".blob"))
+
+    def index(self, name):
+        if name + ".values" not in self.header["sections"]:
+            return None
+        return _SortedIndex(self.strings(name + ".keys"),
+                            self.section(name + ".value_offsets"),
+                            self.section(name + ".values"))
+
+    def _attach(self):
+        header = self.header
+        ont = Trips(stop=header["stop"])
+        ont._shared_path = self.path
+        ont._snapshot_key = header["key"]
+        ont.use_stop = header["use_stop"]
+        ont.max_wn_depth = header["max_wn_depth"]
+        names = self.strings("names")
+        types = self.index("types")
+        ont._hierarchy = TripsHierarchy(
+            names,
+            self.section("parent"),
+            self.section("depth"),
+            self.section("last"),
+            up=[self.section("up%d" % k) for k in range(header["uplevels"])],
+            index=_SharedIdIndex(types)
+        )
+        records = _Records(self.section("records.offsets"), self.section("records.blob"))
+        ont._data = SharedTypes(ont, names, types, records)
+        ont._words = SharedWords(self.index("words"), names, header["pos"])
+        ont._wordnet_index = _SharedTypeIndex(self.index("wordnet_index"), ont._data)
+        ont._definition_index = _SharedNameIndex(self.index("definitions"), names)
+        table = self.index("wordnet_table")
+        if table is not None:
+            ont._wordnet_table = _SharedNameIndex(table, names)
+            ont._wordnet_table_depth = header["wordnet_table_depth"]
+        ont._significance = TripsSignificance(
+            self.section("significance.flag"),
+            self.section("significance.significant"),
+            self.section("significance.level")
+        )
+        ont._feature_index = TripsFeatureIndex(_SharedFeatureBits(self.index("features"), len(names)), len(names))
+        r = header["restrictions"]
+        ont._restriction_index = TripsRestrictionIndex(
+            r["roles"], r["fltypes"], r["constraints"],
+            **{name: self.section("restrictions." + name) for name in TripsRestrictionIndex.arrays}
+        )
+        return ont
+
+
+class _SharedIdIndex(Mapping):
+    """type name -> id"""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __getitem__(self, name):
+        i = self._index.find(name)
+        if i < 0:
+            raise KeyError(name)
+        return self._index.ids(i)[0]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def shared_path(skip_lexicon=False, use_gloss=False, directory=None):
+    key = snapshot_key(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    name = "ontology-{}-{}-{}-v{}.shared".format(
+        key["jsontrips"],
+        "gloss" if use_gloss else "nogloss",
+        "nolex" if skip_lexicon else "lex",
+        key["format"]
+    )
+    return os.path.join(directory or snapshot_dir(), name)
+
+
+def compile_shared(path=None, skip_lexicon=False, use_gloss=False, log=False, ont=None):
+    """Build the ontology (unless given) and write it in the shared format"""
+    if path is None:
+        path = shared_path(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    if ont is None:
+        ont = build(skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+    write_shared(ont, path, skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    logger.info("wrote shared ontology to %s" % path)
+    return path
+
+
+def attach(path=None, skip_lexicon=False, use_gloss=False, log=False, rebuild=True,
+           persistent_cache=None):
+    """Map a shared ontology file and return its Trips instance.  A missing
+    or stale file is rebuilt if rebuild is set.  If persistent_cache is True
+    or a path, query results are also kept on disk (see Trips.persist_cache)."""
+    if path is None:
+        path = shared_path(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    key = snapshot_key(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    try:
+        header, _ = _read_header(path)
+    except OSError:
+        header = None
+    if not header or header["key"] != key:
+        if not rebuild:
+            return None
+        compile_shared(path, skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+    ont = SharedOntology(path).ontology
+    if persistent_cache:
+        ont.persist_cache(None if persistent_cache is True else persistent_cache)
+    return ont
@@ -2,5 +2,81 @@
 # WuPalmer
 # IC based?
 # WordNet scaling
+"""
+Vectorized similarity between two sets of types.
 
+All metrics are computed from the hierarchy arrays (see TripsHierarchy), the
+lowest common ancestors of every pair are found with one binary lifting pass
+over the whole matrix.
+"""
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("Install pytrips[similarity]")
 
+from ..structures import TripsType
+
+
+def type_ids(ont, types):
+    """hierarchy ids for a sequence of types or type names"""
+    ids = []
+    for t in types:
+        if type(t) is not TripsType:
+            name = t
+            t = ont.get_trips_type(t) if type(t) is str else None
+            if t is None:
+                raise ValueError("unknown type: {}".format(name))
+        ids.append(t.id)
+    return np.array(ids, dtype=np.intc)
+
+
+def _array(values):
+    return np.frombuffer(values, dtype=np.intc)
+
+
+def lca_matrix(hierarchy, a, b):
+    """ids of the lowest common ancestors of every pair of ids in a and b"""
+    last = _array(hierarchy.last)
+    up = [_array(level) for level in hierarchy.up]
+    a = a[:, None]
+    b = b[None, :]
+    contains = lambda x, y: (x <= y) & (y <= last[x])
+    u = np.broadcast_to(a, (a.shape[0], b.shape[1]))
+    for level in reversed(up):
+        c = level[u]
+        u = np.where(contains(c, b), u, c)
+    res = up[0][u]
+    # the walk only finds strict ancestors of a
+    return np.where(contains(a, b), a, res)
+
+
+def similarity_matrix(ont, a, b, metric="wup"):
+    """Matrix of metric ("wup", "cosine" or "path_len") between every type in
+    a and every type in b"""
+    hierarchy = ont._hierarchy
+    a = type_ids(ont, a)
+    b = type_ids(ont, b)
+    depth = _array(hierarchy.depth)
+    lcsd = depth[lca_matrix(hierarchy, a, b)]
+    da = depth[a][:, None]
+    db = depth[b][None, :]
+    if metric == "path_len":
+        return da + db - 2 * lcsd
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if metric == "wup":
+            return 2 * lcsd / (da + db)
+        elif metric == "cosine":
+            return lcsd / np.sqrt(da * db)
+    raise ValueError("unknown metric: {}".format(metric))
+
+
+def wup_matrix(ont, a, b):
+    return similarity_matrix(ont, a, b, metric="wup")
+
+
+def cosine_matrix(ont, a, b):
+    return similarity_matrix(ont, a, b, metric="cosine")
+
+
+def path_len_matrix(ont, a, b):
+    return similarity_matrix(ont, a, b, metric="path_len")
@@ -0,0 +1,133 @@
+"""Compiled on-disk snapshots of a loaded ontology.
+
+Building the ontology from jsontrips means parsing the json files and
+constructing every type, which dominates startup time.  A snapshot is the
+pickled result of that work, preceded by a small header recording what it
+was built from.  A snapshot is only used when its header matches the
+installed jsontrips, the pytrips snapshot format and the load options.
+"""
+import logging
+import os
+import pickle
+import tempfile
+
+from .ontology import load
+
+logger = logging.getLogger("pytrips.snapshot")
+
+# bump this whenever the pickled layout of Trips or the structures changes
+FORMAT = 15
+
+
+def jsontrips_version():
+    try:
+        from importlib.metadata import version
+    except ImportError:
+        from pkg_resources import get_distribution
+        version = lambda x: get_distribution(x).version
+    try:
+        return version("jsontrips")
+    except Exception:
+        return "unknown"
+
+
+def snapshot_key(skip_lexicon=False, use_gloss=False):
+    """The header a snapshot must carry to be loaded with these options"""
+    from . import __VERSION__
+    return {
+        "format": FORMAT,
+        "pytrips": __VERSION__,
+        "jsontrips": jsontrips_version(),
+        "skip_lexicon": bool(skip_lexicon),
+        "use_gloss": bool(use_gloss),
+    }
+
+
+def snapshot_dir():
+    """Snapshots live in $PYTRIPS_CACHE, or ~/.cache/pytrips by default"""
+    default = os.path.join(os.path.expanduser("~"), ".cache", "pytrips")
+    return os.environ.get("PYTRIPS_CACHE", default)
+
+
+def snapshot_path(skip_lexicon=False, use_gloss=False, directory=None):
+    key = snapshot_key(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    name = "ontology-{}-{}-{}-v{}.pickle".format(
+        key["jsontrips"],
+        "gloss" if use_gloss else "nogloss",
+        "nolex" if skip_lexicon else "lex",
+        key["format"]
+    )
+    return os.path.join(directory or snapshot_dir(), name)
+
+
+def write_snapshot(ont, path, skip_lexicon=False, use_gloss=False):
+    """Write ont to path.  The file is replaced atomically so that concurrent
+    workers never see a partial snapshot."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".pytrips-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            pickle.dump(snapshot_key(skip_lexicon, use_gloss), out, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(ont, out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def read_snapshot(path, skip_lexicon=False, use_gloss=False):
+    """Return the ontology stored at path, or None if it is missing or stale"""
+    try:
+        with open(path, "rb") as inp:
+            header = pickle.load(inp)
+            if header != snapshot_key(skip_lexicon, use_gloss):
+                logger.info("snapshot at %s is stale" % path)
+                return None
+            return pickle.load(inp)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+        logger.info("could not read snapshot at %s: %s" % (path, e))
+        return None
+
+
+def build(skip_lexicon=False, use_gloss=False, log=False):
+    """Build the ontology along with the tables that are only worth
+    computing ahead of time"""
+    ont = load(skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+    ont.resolve_wordnet_keys()
+    ont.build_wordnet_table()
+    ont.significance()
+    ont.feature_index()
+    ont.restriction_index()
+    return ont
+
+
+def compile_ontology(path=None, skip_lexicon=False, use_gloss=False, log=False):
+    """Build the ontology from jsontrips and write it as a snapshot.
+    Returns the ontology."""
+    if path is None:
+        path = snapshot_path(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    ont = build(skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+    write_snapshot(ont, path, skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    logger.info("wrote snapshot to %s" % path)
+    return ont
+
+
+def load_snapshot(path=None, skip_lexicon=False, use_gloss=False, log=False, rebuild=True):
+    """Load the ontology from a snapshot.  If the snapshot is missing or stale
+    and rebuild is set, the ontology is built and the snapshot rewritten.
+    A snapshot that cannot be written is not an error."""
+    if path is None:
+        path = snapshot_path(skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    ont = read_snapshot(path, skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    if ont is not None or not rebuild:
+        return ont
+    ont = build(skip_lexicon=skip_lexicon, use_gloss=use_gloss, log=log)
+    try:
+        write_snapshot(ont, path, skip_lexicon=skip_lexicon, use_gloss=use_gloss)
+    except OSError as e:
+        logger.warning("could not write snapshot to %s: %s" % (path, e))
+    return ont
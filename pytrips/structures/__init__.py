@@ -1,3 +1,6 @@
-from .restrictions import TripsRestriction
+from .restrictions import TripsRestriction, TripsRestrictionIndex
 from .tripstype import TripsType
 from .sem import TripsSem
+from .hierarchy import TripsHierarchy, TripsSignificance
+from .features import TripsFeatureIndex
+from .words import TripsWordIndex, edit_distance
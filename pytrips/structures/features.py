@@ -0,0 +1,87 @@
+class TripsFeatureIndex(object):
+    """
+    Semantic feature index over a TripsHierarchy.
+
+    Every (feature, value) pair maps to a bitset, a python int where bit i
+    is set if the type with hierarchy id i has that value.  Variables with a
+    set of allowed values (["?", var, v1, v2, ...]) set the bit of every
+    allowed value, and the semantic type is indexed as the feature "type".
+    Features and values are lowercase.
+
+    Since a subtree is a contiguous range of ids, restricting a query to the
+    descendants of a type is a single mask.
+    """
+
+    def __init__(self, bits, size):
+        self.bits = bits
+        self.size = size
+
+    @classmethod
+    def build(cls, sems):
+        """sems is the TripsSem of every type, ordered by hierarchy id"""
+        bits = {}
+        for i, sem in enumerate(sems):
+            if sem is None:
+                continue
+            values = sem.sem
+            values["type"] = sem.type
+            for feature, value in values.items():
+                if type(value) is list:
+                    value = value[2:] if value[:1] == ["?"] else value
+                else:
+                    value = [value]
+                for v in value:
+                    key = (feature.lower(), str(v).lower())
+                    bits[key] = bits.get(key, 0) | (1 << i)
+        return cls(bits, len(sems))
+
+    @staticmethod
+    def _key(feature, value):
+        return feature.lower().lstrip(":"), str(value).lower()
+
+    def features(self):
+        """{feature: sorted values}"""
+        res = {}
+        for f, v in self.bits:
+            res.setdefault(f, []).append(v)
+        return {f: sorted(v) for f, v in res.items()}
+
+    def mask(self, feature, value):
+        """bitset of the types with feature set to value.  A list or tuple
+        of values matches any of them."""
+        if type(value) in (list, tuple):
+            res = 0
+            for v in value:
+                res |= self.bits.get(self._key(feature, v), 0)
+            return res
+        return self.bits.get(self._key(feature, value), 0)
+
+    @staticmethod
+    def subtree_mask(hierarchy, a):
+        """bitset of a and all of its descendants"""
+        return ((1 << (hierarchy.last[a] - a + 1)) - 1) << a
+
+    def query(self, features, match="all", within=None):
+        """bitset of the types matching the {feature: value} constraints,
+        all of them if match is "all" or at least one if it is "any".
+        within is a bitset the result is restricted to."""
+        if match not in ("all", "any"):
+            raise ValueError("match must be 'all' or 'any': {}".format(match))
+        conjunctive = match == "all"
+        res = (1 << self.size) - 1 if conjunctive else 0
+        for feature, value in features.items():
+            if conjunctive:
+                res &= self.mask(feature, value)
+            else:
+                res |= self.mask(feature, value)
+        if within is not None:
+            res &= within
+        return res
+
+    @staticmethod
+    def ids(bits):
+        """ids set in a bitset, in increasing order"""
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
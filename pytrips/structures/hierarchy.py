@@ -0,0 +1,180 @@
+from array import array
+import math
+
+
+class TripsHierarchy(object):
+    """
+    Array-backed labelling of the type hierarchy.
+
+    Every type is numbered by its position in a pre-order walk from the root
+    (children are visited in name order, so numbering is stable for a given
+    ontology).  The subtree of a type with id i is exactly the ids
+    i..last[i], so subsumption is an interval check and does not depend on
+    depth.
+
+    Lowest common ancestors are found by binary lifting: up[k][i] is the
+    2**k-th ancestor of i (the root is its own ancestor), so an lca costs
+    O(log depth) interval checks.
+    """
+
+    def __init__(self, names, parent, depth, last, up=None, index=None):
+        self.names = names
+        if index is None:
+            index = {n: i for i, n in enumerate(names)}
+        self.index = index
+        self.parent = parent
+        self.depth = depth
+        self.last = last
+        if up is None:
+            up = self.lift(parent, depth)
+        self.up = up
+
+    @staticmethod
+    def lift(parent, depth):
+        """binary lifting table for the parent array"""
+        up = [array('i', [max(p, 0) for p in parent])]
+        for _ in range(max(max(depth, default=0), 1).bit_length() - 1):
+            prev = up[-1]
+            up.append(array('i', [prev[p] for p in prev]))
+        return up
+
+    @classmethod
+    def build(cls, parents, root="root"):
+        """parents maps every type name to its parent's name.  Types whose
+        parent is missing are attached to the root."""
+        children = {n: [] for n in parents}
+        for n, p in parents.items():
+            if n == root:
+                continue
+            if p not in children:
+                p = root
+            children[p].append(n)
+
+        names = []
+        parent = array('i')
+        depth = array('i')
+        last = array('i')
+        # iterative pre-order walk, entries are (name, parent id, depth)
+        stack = [(root, -1, 0)]
+        while stack:
+            name, p, d = stack.pop()
+            names.append(name)
+            parent.append(p)
+            depth.append(d)
+            last.append(0)
+            i = len(names) - 1
+            stack.extend((c, i, d + 1) for c in sorted(children[name], reverse=True))
+        # a parent's subtree ends where its last descendant's does
+        for i in range(len(names) - 1, -1, -1):
+            last[i] = max(last[i], i)
+            if parent[i] >= 0:
+                last[parent[i]] = max(last[parent[i]], last[i])
+        return cls(names, parent, depth, last)
+
+    def __len__(self):
+        return len(self.names)
+
+    def contains(self, a, b):
+        """true if b is a or one of its descendants"""
+        return a <= b <= self.last[a]
+
+    def subsumes(self, a, b, max_depth=-1):
+        """true if b is a strict descendant of a.  If max_depth is not
+        negative, b may be at most max_depth + 1 levels below a."""
+        if not a < b <= self.last[a]:
+            return False
+        return max_depth < 0 or self.depth[b] - self.depth[a] <= max_depth + 1
+
+    def lca(self, a, b):
+        """lowest common ancestor of a and b"""
+        if a <= b <= self.last[a]:
+            return a
+        if b <= a <= self.last[b]:
+            return b
+        last = self.last
+        for level in reversed(self.up):
+            u = level[a]
+            if not u <= b <= last[u]:
+                a = u
+        return self.up[0][a]
+
+    def path_len(self, a, b):
+        depth = self.depth
+        return depth[a] + depth[b] - 2 * depth[self.lca(a, b)]
+
+    def wup(self, a, b):
+        depth = self.depth
+        return 2 * depth[self.lca(a, b)] / (depth[a] + depth[b])
+
+    def cosine(self, a, b):
+        depth = self.depth
+        return depth[self.lca(a, b)] / math.sqrt(depth[a] * depth[b])
+
+    def subtree(self, a):
+        """ids of a and all of its descendants"""
+        return range(a, self.last[a] + 1)
+
+
+class TripsSignificance(object):
+    """
+    Significance of every type in a TripsHierarchy.
+
+    A type is significant if it differs semantically from its parent (the
+    root always is).  significant[i] is the nearest significant ancestor of
+    i, including i itself, and level[i] the number of significant strict
+    ancestors-or-self of i below the root, so the significant types form a
+    coarser tree whose depth is level.
+    """
+
+    def __init__(self, flag, significant, level):
+        self.flag = flag
+        self.significant = significant
+        self.level = level
+
+    @classmethod
+    def build(cls, hierarchy, differs):
+        """differs(i, p) is true if type i differs from its parent p"""
+        n = len(hierarchy)
+        flag = array('b', [1]) * n
+        significant = array('i', range(n))
+        level = array('i', [0]) * n
+        parent = hierarchy.parent
+        # parents come before their children in pre-order
+        for i in range(1, n):
+            p = parent[i]
+            if differs(i, p):
+                level[i] = level[p] + 1
+            else:
+                flag[i] = 0
+                significant[i] = significant[p]
+                level[i] = level[p]
+        return cls(flag, significant, level)
+
+    def parent(self, hierarchy, a):
+        """next significant strict ancestor of a, the root is its own"""
+        p = hierarchy.parent[a]
+        return a if p < 0 else self.significant[p]
+
+    def ancestors(self, hierarchy, a):
+        """significant ancestors-or-self of a below the root, nearest first"""
+        res = []
+        a = self.significant[a]
+        while a > 0:
+            res.append(a)
+            a = self.significant[hierarchy.parent[a]]
+        return res
+
+    def descendants(self, hierarchy, a):
+        """significant strict descendants of a in pre-order"""
+        flag = self.flag
+        return [i for i in range(a + 1, hierarchy.last[a] + 1) if flag[i]]
+
+    def subsumes(self, hierarchy, a, b, max_depth=-1):
+        """true if the significant class of b lies strictly below that of a.
+        If max_depth is not negative, it may be at most max_depth + 1
+        significant levels below."""
+        a = self.significant[a]
+        b = self.significant[b]
+        if b == 0 or not a < b <= hierarchy.last[a]:
+            return False
+        return max_depth < 0 or self.level[b] - self.level[a] <= max_depth + 1
@@ -1,36 +1,266 @@
+from array import array
+import sys
+
+
+def _alternatives(value):
+    """values allowed by a restriction value and whether they are negated.
+    (? var a b) allows a or b, (? !var a b) anything but a or b"""
+    if type(value) is list:
+        if value[:1] == ["?"]:
+            return tuple(value[2:]), len(value) > 1 and str(value[1]).startswith("!")
+        return tuple(value), False
+    if value is None:
+        return (), False
+    return (value,), False
+
+
+def _lower(values):
+    return tuple(sorted({sys.intern(str(x).lower()) for x in values}))
+
+
 class TripsRestriction(object):
+    """
+    Selectional restriction of one role.
+
+    A restriction constrains the semantic type of the filler (phys-obj,
+    situation, ...), its ontology type (the TYPE feature, the filler must be
+    one of the named types or their descendants) and its other semantic
+    features.  Ontology types are resolved to hierarchy ids when the
+    ontology is loaded (see resolve), so satisfied_by is a few interval
+    checks.
+    """
+    __slots__ = ("__ont", "__role", "__fltypes", "__restrs", "__negated", "__ids",
+                 "__features", "__optionality")
+
     def __init__(self, role, restrs, optionality, ont):
         self.__ont = ont
-        self.__role = role
-        self.__restrs = set()
-        for x in restrs:
-            if type(x) is list:
-                self.__restrs.update(x[2:])
-            if type(x) is str:
-                self.__restrs.add(x)
-        self.__restrs = {x.lower() for x in self.__restrs}
-        self.__optionality = optionality
+        self.__role = sys.intern(role)
+        self.__fltypes = ()
+        self.__negated = False
+        self.__ids = None
+        features = []
+        types = set()
+        if type(restrs) is dict:
+            self.__fltypes = _lower(_alternatives(restrs.get("type", restrs.get("typeq")))[0])
+            for f in restrs.get("features") or []:
+                if len(f) != 2:
+                    continue
+                values, negated = _alternatives(f[1])
+                if f[0].lower() == "type":
+                    types.update(values)
+                    self.__negated = negated
+                else:
+                    features.append((sys.intern(f[0].lower()), _lower(values), negated))
+        else:
+            for x in restrs:
+                if type(x) is list:
+                    types.update(x[2:])
+                if type(x) is str:
+                    types.add(x)
+        self.__restrs = _lower(types)
+        self.__features = tuple(features)
+        self.__optionality = sys.intern(optionality)
+
+    def resolve(self, index, fltypes):
+        """Resolve the named ontology types to hierarchy ids and drop
+        semantic types that are not in fltypes (variables such as T or
+        TYPE, which leave the semantic type open)"""
+        self.__ids = tuple(sorted(index[r] for r in self.__restrs if r in index))
+        self.__fltypes = tuple(x for x in self.__fltypes if x in fltypes)
 
     @property
     def role(self):
         return self.__role.lower()
 
+    @property
+    def names(self):
+        """the names of the ontology types in the restriction, including
+        the ones that are not in the ontology"""
+        return self.__restrs
+
     @property
     def restrictions(self):
-        return [x for x in [self.__ont[r] for r in self.__restrs] if x]
+        """the ontology types in the restriction"""
+        return tuple(self.__ont.get_trips_type_by_id(i) for i in self.__ids or ())
+
+    @property
+    def ids(self):
+        """hierarchy ids of the ontology types in the restriction"""
+        return self.__ids
+
+    @property
+    def negated(self):
+        """true if the filler must not be one of the ontology types"""
+        return self.__negated
+
+    @property
+    def fltypes(self):
+        """allowed semantic types of the filler, empty if any is"""
+        return self.__fltypes
+
+    @property
+    def features(self):
+        """(feature, allowed values, negated) for every other feature"""
+        return self.__features
 
     @property
     def optionality(self):
         return self.__optionality
 
+    def satisfied_by(self, filler):
+        """true if the TripsType filler meets every part of the restriction"""
+        sem = filler.sem
+        if self.__fltypes and (sem is None or sem.type not in self.__fltypes):
+            return False
+        if self.__restrs:
+            last = self.__ont._hierarchy.last
+            i = filler.id
+            if any(a <= i <= last[a] for a in self.__ids or ()) == self.__negated:
+                return False
+        if self.__features and sem is not None:
+            values = sem.sem
+            for feature, allowed, negated in self.__features:
+                v = values.get(feature)
+                # unset or variable features do not conflict
+                if v is None or type(v) is list:
+                    continue
+                if (v.lower() in allowed) == negated:
+                    return False
+        return True
+
     def __str__(self):
-        return "[:%s %s]".format(self.role, ", ".join(self.restrictions))
+        return "[:{} {}]".format(self.role, " ".join(self.__fltypes + self.__restrs))
 
     def __repr__(self):
-        res = ""
-        if self.restrictions:
-            res = self.restrictions[0]
+        res = (self.__restrs or self.__fltypes)[:1]
         post = ""
-        if len(self.restrictions) > 1:
-            post = "and {} others".format(len(self.restrictions)-1)
-        return "<TripsRestriction :{} {}{}>".format(self.role, res, post)
+        if len(self.__restrs or self.__fltypes) > 1:
+            post = " and {} others".format(len(self.__restrs or self.__fltypes)-1)
+        return "<TripsRestriction :{} {}{}>".format(self.role, " ".join(res), post)
+
+
+class TripsRestrictionIndex(object):
+    """
+    Reverse index from fillers to the (type id, role) slots that accept them.
+
+    Every argument restriction is compiled into flat arrays, so checking a
+    slot does not need its TripsRestriction (or its type) and the index can
+    be read straight from a shared file.  Per slot: the type id and role,
+    the allowed semantic types, whether it names ontology types and is
+    negated (slot_flags), the resolved ids and the feature constraints.
+    Lists are stored as offsets into a values array, slot s owns
+    values[offsets[s]:offsets[s+1]].
+
+    Slots that name ontology types are keyed by the ids of those types, so
+    the candidates for a filler are the slots keyed by the filler or one of
+    its ancestors.  The others are keyed by their semantic types (None if
+    any is allowed).  Candidates are then checked like satisfied_by.
+    """
+    arrays = ("slot_type", "slot_role", "slot_flags",
+              "fltype_offsets", "fltype_values", "id_offsets", "id_values",
+              "feature_offsets", "feature_values", "by_type_offsets", "by_type_values",
+              "by_fltype_offsets", "by_fltype_values")
+
+    def __init__(self, roles, fltypes, constraints, **arrays):
+        """roles and fltypes are the names the arrays refer to, constraints
+        the (feature, allowed values, negated) feature constraints"""
+        self.roles = tuple(roles)
+        self.fltypes = tuple(fltypes)
+        self.constraints = tuple((f, tuple(v), n) for f, v, n in constraints)
+        self._fltype_ids = {f: i for i, f in enumerate(self.fltypes)}
+        for name in self.arrays:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.slot_type)
+
+    @classmethod
+    def build(cls, types):
+        """types is every TripsType, ordered by hierarchy id"""
+        roles = {}
+        fltypes = {}
+        constraints = {}
+        a = {name: array('i') for name in cls.arrays}
+        a["slot_flags"] = array('b')
+        for name in ("fltype_offsets", "id_offsets", "feature_offsets"):
+            a[name].append(0)
+        by_type = {}
+        by_fltype = {}
+        n = 0
+        for t in types:
+            n += 1
+            for r in t.arguments:
+                s = len(a["slot_type"])
+                a["slot_type"].append(t.id)
+                a["slot_role"].append(roles.setdefault(r.role, len(roles)))
+                a["slot_flags"].append(bool(r.names) | r.negated << 1)
+                a["fltype_values"].extend(fltypes.setdefault(f, len(fltypes)) for f in r.fltypes)
+                a["fltype_offsets"].append(len(a["fltype_values"]))
+                a["id_values"].extend(r.ids or ())
+                a["id_offsets"].append(len(a["id_values"]))
+                a["feature_values"].extend(constraints.setdefault(c, len(constraints)) for c in r.features)
+                a["feature_offsets"].append(len(a["feature_values"]))
+                if r.ids and not r.negated:
+                    for i in r.ids:
+                        by_type.setdefault(i, []).append(s)
+                else:
+                    for f in r.fltypes or (None,):
+                        by_fltype.setdefault(f, []).append(s)
+        _flatten(by_type, range(n), a["by_type_offsets"], a["by_type_values"])
+        # bucket 0 holds the slots that allow any semantic type
+        fltype_keys = [None] + sorted(fltypes, key=fltypes.get)
+        _flatten(by_fltype, fltype_keys, a["by_fltype_offsets"], a["by_fltype_values"])
+        return cls(sorted(roles, key=roles.get), fltype_keys[1:],
+                   sorted(constraints, key=constraints.get), **a)
+
+    @staticmethod
+    def _values(offsets, values, i):
+        return values[offsets[i]:offsets[i + 1]]
+
+    def satisfied(self, s, hierarchy, filler):
+        """true if the TripsType filler meets the restriction of slot s"""
+        sem = filler.sem
+        fltypes = self._values(self.fltype_offsets, self.fltype_values, s)
+        if len(fltypes) and (sem is None or self._fltype_ids.get(sem.type, -1) not in fltypes):
+            return False
+        flags = self.slot_flags[s]
+        if flags & 1:
+            last = hierarchy.last
+            i = filler.id
+            ids = self._values(self.id_offsets, self.id_values, s)
+            if any(a <= i <= last[a] for a in ids) == bool(flags & 2):
+                return False
+        features = self._values(self.feature_offsets, self.feature_values, s)
+        if len(features) and sem is not None:
+            values = sem.sem
+            for c in features:
+                feature, allowed, negated = self.constraints[c]
+                v = values.get(feature)
+                # unset or variable features do not conflict
+                if v is None or type(v) is list:
+                    continue
+                if (v.lower() in allowed) == negated:
+                    return False
+        return True
+
+    def accepting(self, hierarchy, filler):
+        """(type id, role) of every slot the filler satisfies"""
+        candidates = set(self._values(self.by_fltype_offsets, self.by_fltype_values, 0))
+        if filler.sem is not None and filler.sem.type in self._fltype_ids:
+            k = self._fltype_ids[filler.sem.type] + 1
+            candidates.update(self._values(self.by_fltype_offsets, self.by_fltype_values, k))
+        i = filler.id
+        while i >= 0:
+            candidates.update(self._values(self.by_type_offsets, self.by_type_values, i))
+            i = hierarchy.parent[i]
+        roles = self.roles
+        return [(self.slot_type[s], roles[self.slot_role[s]])
+                for s in sorted(candidates) if self.satisfied(s, hierarchy, filler)]
+
+
+def _flatten(lists, keys, offsets, values):
+    """lay out {key: list} as offsets and values in the order of keys"""
+    offsets.append(0)
+    for k in keys:
+        values.extend(lists.get(k, ()))
+        offsets.append(len(values))
@@ -1,4 +1,6 @@
 class TripsSem(object):
+    __slots__ = ("__ont", "__features", "__default", "__type")
+
     def __init__(self, features=None, default=None, type_=None, ont=None):
         self.__ont = ont
         if not features:
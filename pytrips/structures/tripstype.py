@@ -1,12 +1,22 @@
 from ..helpers import get_wn_key, all_hyponyms
-from anytree import NodeMixin, RenderTree
+from anytree import RenderTree
+from array import array
+from bisect import bisect_right
 import json
+import math
+import sys
+
+
+def _freeze(x):
+    if type(x) is list:
+        return tuple(_freeze(y) for y in x)
+    return x
 
 
 class AbstractTripsType(object):
-    pass
+    __slots__ = ()
 
-class TripsType(AbstractTripsType, NodeMixin):
+class TripsType(AbstractTripsType):
     """
     Note: in order for the operations to work, at least one of the
     types must explicitly be a TripsType
@@ -15,49 +25,74 @@ class TripsType(AbstractTripsType, NodeMixin):
     subsumption: t1 < t2, s1 < t2, t1 < s2
     lcs: t1 ^ t2, s1 ^ t2, t1 ^ s2
 
+    Types are compact, read-only records: names are interned, collections
+    are stored as tuples and returned without copying, and definitions are
+    kept as a json string until they are first read.  The full ontology with
+    its lexicon should stay under 25MB of python objects, measured with
+    tracemalloc around load_json (about 20MB today, down from about 41MB).
+
+    The anytree navigation properties (ancestors, descendants, path, root,
+    siblings, leaves, is_root, is_leaf, height) are answered from the
+    hierarchy labelling.
+
     # WARNING: arguments are currently not loaded.  There is a raw dict there
     """
+    __slots__ = ("__name", "__label", "__parent", "__children", "__arguments", "__sem", "__words",
+                 "__wordnet", "__wordnet_keys", "__definitions", "__frozen_definitions",
+                 "__ont", "__id")
 
     def __init__(self, name, parent, children, words, wordnet, arguments, sem, definitions, ont):
-        self.__name = name.lower()
+        self.__name = sys.intern(name.lower())
+        self.__label = sys.intern("ont::" + self.__name)
         if parent:
-            self.__parent = parent.lower()
+            self.__parent = sys.intern(parent.lower())
         else:
             self.__parent = None
-        self.__children = children
-        self.__arguments = arguments
+        self.__children = tuple(sys.intern(c.lower()) for c in children)
+        self.__arguments = tuple(arguments)
         self.__sem = sem
-        self.__words = [w.lower() for w in words]
-        self.__wordnet = [w.lower() for w in wordnet]
+        self.__words = tuple(sys.intern(w.lower()) for w in words)
+        self.__wordnet = tuple(sys.intern(w.lower()) for w in wordnet)
         self.__wordnet_keys = None
-        self.__definitions = json.loads(json.dumps(definitions))
+        self.__definitions = json.dumps(definitions, separators=(",", ":")) if definitions else None
+        self.__frozen_definitions = None
         self.__ont = ont
-        # TODO: set numerical id
+        self.__id = None
+
+    def _set_id(self, id_):
+        self.__id = id_
+
+    @property
+    def id(self):
+        """position of the type in the pre-order labelling of the hierarchy"""
+        return self.__id
 
     def subtree_string(self, max_depth=1000):
         return "\n".join(["%s%s" % (a, c.name) for a, b, c in RenderTree(self, maxlevel=max_depth)])
 
     @property
     def depth(self):
-        if self == "ont::root":
-            return 0
-        return self.parent.depth + 1
+        return self.__ont._hierarchy.depth[self.__id]
 
     @property
     def name(self):
         return self.__name
 
+    @property
+    def parent_name(self):
+        return self.__parent
+
     @property
     def parent(self):
         return self.__ont[self.__parent]
 
     @property
     def children(self):
-        return [self.__ont[c] for c in self.__children]
+        return tuple(self.__ont[c] for c in self.__children)
 
     @property
     def arguments(self):
-        return self.__arguments[:]
+        return self.__arguments
 
     @property
     def sem(self):
@@ -65,52 +100,149 @@ class TripsType(AbstractTripsType, NodeMixin):
 
     @property
     def definitions(self):
-        return self.__definitions[:]
+        if self.__frozen_definitions is None:
+            if self.__definitions is None:
+                self.__frozen_definitions = ()
+            else:
+                self.__frozen_definitions = _freeze(json.loads(self.__definitions))
+        return self.__frozen_definitions
 
     @property
     def words(self):
-        return self.__words[:]
+        return self.__words
+
+    @property
+    def is_root(self):
+        return self.__id == 0
+
+    @property
+    def is_leaf(self):
+        return self.__ont._hierarchy.last[self.__id] == self.__id
+
+    @property
+    def root(self):
+        return self.__ont.get_trips_type_by_id(0)
+
+    @property
+    def ancestors(self):
+        """all ancestors, starting at the root"""
+        parent = self.__ont._hierarchy.parent
+        res = []
+        i = parent[self.__id]
+        while i >= 0:
+            res.append(self.__ont.get_trips_type_by_id(i))
+            i = parent[i]
+        return tuple(reversed(res))
+
+    @property
+    def path(self):
+        """the path from the root to this type"""
+        return self.ancestors + (self,)
+
+    @property
+    def descendants(self):
+        """all descendants in pre-order"""
+        h = self.__ont._hierarchy
+        return tuple(self.__ont.get_trips_type_by_id(i) for i in h.subtree(self.__id)[1:])
+
+    @property
+    def leaves(self):
+        h = self.__ont._hierarchy
+        return tuple(self.__ont.get_trips_type_by_id(i) for i in h.subtree(self.__id) if h.last[i] == i)
+
+    @property
+    def siblings(self):
+        if self.is_root:
+            return ()
+        return tuple(c for c in self.parent.children if c and c != self)
+
+    @property
+    def height(self):
+        h = self.__ont._hierarchy
+        return max(h.depth[i] for i in h.subtree(self.__id)) - h.depth[self.__id]
+
+    def _wordnet_closure(self, max_depth):
+        """(synsets, depths) of the hyponyms of the wordnet keys that still
+        map to this type, breadth first, so that the synsets within a depth
+        are a prefix.  Cached by the ontology and extended on demand."""
+        cache = self.__ont._closures
+        hit = cache.get(self.__name)
+        if hit is not None and hit[2] >= max_depth:
+            return hit
+        ont = self.__ont
+        # synsets and depths are kept in visiting order, not in a dict
+        synsets = []
+        depths = array('i')
+        seen = set()
+        for k in self.wordnet_keys:
+            if k not in seen:
+                seen.add(k)
+                synsets.append(k)
+                depths.append(0)
+        frontier = list(synsets)
+        depth = 0
+        while frontier and depth < max_depth:
+            depth += 1
+            nxt = []
+            for s in frontier:
+                for h, _ in all_hyponyms(s):
+                    if h not in seen and self in ont[h]:
+                        seen.add(h)
+                        synsets.append(h)
+                        depths.append(depth)
+                        nxt.append(h)
+            frontier = nxt
+        # an exhausted walk answers every depth
+        hit = (tuple(synsets), depths, max_depth if frontier else math.inf)
+        cache[self.__name] = hit
+        return hit
 
     def wordnet_closure(self, max_depth=-1, pos=None):
         if max_depth == -1:
             max_depth = self.__ont.max_wn_depth
-        clsr = set([k for k in self.wordnet_keys if k.pos() == pos or not pos])
-        for key in self.wordnet_keys:
-            ext = list(key.closure(lambda s: [t for t in all_hyponyms(s) if self in self.__ont[t]], depth=max_depth))
-            clsr.update(ext)
-        return clsr
+        synsets, depths, _ = self._wordnet_closure(max_depth)
+        return set(s for s in synsets[:bisect_right(depths, max_depth)] if s.pos() == pos or not pos)
+
+    def _word_closure(self, max_depth, pos):
+        key = (self.__name, max_depth, pos)
+        words = self.__ont._closures.get(key)
+        if words is None:
+            words = frozenset(w.name() for s in self.wordnet_closure(max_depth=max_depth, pos=pos)
+                              for w in s.lemmas())
+            self.__ont._closures[key] = words
+        return words
 
     def word_closure(self, max_depth=3, pos=None):
-        clsr = self.wordnet_closure(max_depth=max_depth, pos=pos)
-        words = set()
-        for key in clsr:
-            words.update([w.name() for w in key.lemmas()])
-        return words
+        return set(self._word_closure(max_depth, pos))
 
     def is_a_closure(self, max_depth=3, pos=None):
-        clsr = self.word_closure(max_depth, pos=pos)
-        for c in self.children:
-            clsr.update(c.is_a_closure(max_depth))
+        """word closures of the type and all of its descendants"""
+        ont = self.__ont
+        clsr = set()
+        for i in ont._hierarchy.subtree(self.id):
+            clsr.update(ont.get_trips_type_by_id(i)._word_closure(max_depth, pos))
         return clsr
 
     @property
     def wordnet(self):
-        return self.__wordnet[:]
+        return self.__wordnet
 
     @property
     def wordnet_keys(self):
         if self.__wordnet_keys is None:
-            self.__wordnet_keys = [get_wn_key(s) for s in self.__wordnet if get_wn_key(s)]
-        return self.__wordnet_keys[:]
+            self.__wordnet_keys = tuple(get_wn_key(s) for s in self.__wordnet if get_wn_key(s))
+        return self.__wordnet_keys
 
     def __eq__(self, other):
-        # XXX: does this cause problems with putting things in sets?
-        if not other:
-            return False
+        # types of the same ontology are canonical, so they compare by id
+        if other is self:
+            return True
         elif type(other) is TripsType:
-            return self.name == other.name
+            if self.__ont is other.__ont and self.__id is not None:
+                return self.__id == other.__id
+            return self.__name == other.__name
         elif type(other) is str:
-            return str(self) == other
+            return self.__label == other
         else:
             return False
 
@@ -142,11 +274,22 @@ class TripsType(AbstractTripsType, NodeMixin):
                 raise NotImplemented
         return self.name == other.name or self.subsumes(other)
 
+    def __contains__(self, other):
+        """true if other is this type or one of its descendants"""
+        if type(other) is str:
+            other = self.__ont[other]
+        if type(other) is not TripsType:
+            return False
+        return self.__ont._hierarchy.contains(self.__id, other.id)
+
     def __str__(self):
-        return "ont::" + self.name
+        return self.__label
 
     def __hash__(self):
-        return hash("<TripsType %s>".format(repr(self)))
+        # equal to the hash of the "ont::name" string the type compares equal
+        # to.  str caches its own hash, and unlike a cached int it is safe
+        # to pickle across processes with different hash seeds.
+        return hash(self.__label)
 
     def __repr__(self):
         return str(self)
@@ -162,55 +305,42 @@ class TripsType(AbstractTripsType, NodeMixin):
             other = self.__ont[other]
         if type(other) is not TripsType:
             raise NotImplemented
-        t = reversed(self.path_to_root())
-        s = reversed(other.path_to_root())
-        lcs = self.__ont["root"]
-        pair = zip(t,s)
-        for p, q in pair:
-            if p == q:
-                lcs = p
-        return lcs
+        return self.__ont.get_trips_type_by_id(self.__ont._hierarchy.lca(self.__id, other.id))
 
     def path_len(self, other):
-        return self.depth + other.depth - 2*(self ^ other).depth
+        if type(other) is str:
+            other = self.__ont[other]
+        return self.__ont._hierarchy.path_len(self.__id, other.id)
 
     def wup(self, other):
-        lcsd = (self ^ other).depth
-        return 2 * lcsd/(self.depth + other.depth)
+        if type(other) is str:
+            other = self.__ont[other]
+        return self.__ont._hierarchy.wup(self.__id, other.id)
 
     def cosine(self, other):
-        import math
+        if type(other) is str:
+            other = self.__ont[other]
         if not other:
             return 0
-        lcsd = (self ^ other).depth
-        return lcsd / math.sqrt(self.depth * other.depth)
+        return self.__ont._hierarchy.cosine(self.__id, other.id)
 
     def __xor__(self, other):
         return self.lcs(other)
 
     def subsumes(self, other, max_depth=-1, significant=False):
         """messing with a method this fundamental is dangerous.  
-           Guarantee - node never changes, we only abstract out other"""
-        node = self
-        if significant:
-            node = self.significant()
-            other = other.significant()
-            if node == other:
-                return False # they are in the same class, so no subsumption
+           Guarantee - node never changes, we only abstract out other
+           Plain subsumption is an interval check on the hierarchy labelling,
+           significant subsumption is the same check on the significant
+           representatives (see Trips.significance)."""
         if not other:
             return False # Is this a good idea?
+        hierarchy = self.__ont._hierarchy
+        if significant:
+            return self.__ont.significance().subsumes(hierarchy, self.id, other.id, max_depth=max_depth)
         if other == "ont::root":
             return False
-        elif significant and other in node.significant_children():
-            return True
-        elif not significant and other in node.children:
-            return True
-        elif max_depth == 0:
-            return False
-        elif significant:
-            return node.subsumes(other.significant_parent(), max_depth=max_depth-1)
-        else:
-            return node.subsumes(other.parent, max_depth=max_depth-1)
+        return hierarchy.subsumes(self.id, other.id, max_depth=max_depth)
 
     def differs_semantically_from(self, other):
         if self.sem.differs_from(other.sem):
@@ -221,33 +351,26 @@ class TripsType(AbstractTripsType, NodeMixin):
 
     def significant_parent(self):
         """returns next significant ancestor"""
-        if self == "ont::root":
-            return self
-        return self.parent.significant()
+        ont = self.__ont
+        return ont.get_trips_type_by_id(ont.significance().parent(ont._hierarchy, self.id))
 
     def significant(self):
         """returns next significant node on path to root, including self"""
-        if self == "ont::root":
-            return self
-        if self.differs_semantically_from(self.parent):
-            return self
-        return self.parent.significant()
+        ont = self.__ont
+        return ont.get_trips_type_by_id(ont.significance().significant[self.id])
 
     def significant_ancestors(self):
         """returns all significant ancestors"""
-        if self == "ont::root":
-            return []
-        if self.differs_semantically_from(self.parent):
-            return [self] + self.parent.significant_ancestors()
-        return self.parent.significant_ancestors()
+        ont = self.__ont
+        return [ont.get_trips_type_by_id(i) for i in ont.significance().ancestors(ont._hierarchy, self.id)]
 
     def significant_children(self):
         """return significant immediate children"""
-        return [c for c in self.children if c and self.differs_semantically_from(c)]
+        flag = self.__ont.significance().flag
+        return [c for c in self.children if flag[c.id]]
 
     def significant_descendants(self):
         """return all significant descendants"""
-        if not self.children:
-            return []
-        return sum([c.significant_descendants() for c in self.children], self.significant_children())
+        ont = self.__ont
+        return [ont.get_trips_type_by_id(i) for i in ont.significance().descendants(ont._hierarchy, self.id)]
 
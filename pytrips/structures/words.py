@@ -0,0 +1,118 @@
+from array import array
+from bisect import bisect_left
+import sys
+
+
+def edit_distance(a, b, limit=None):
+    """Optimal string alignment distance (insertions, deletions,
+    substitutions and adjacent transpositions).  If limit is given, any
+    distance over it is returned as limit + 1."""
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (prev2 is not None and j > 1 and a[i - 1] == b[j - 2]
+                    and a[i - 2] == b[j - 1]):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        # a transposition can only reach back one row
+        if limit is not None and min(cur) > limit and min(prev) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _deletes(word, distance):
+    res = {word}
+    front = {word}
+    for _ in range(distance):
+        front = {x[:i] + x[i + 1:] for x in front for i in range(len(x))}
+        res |= front
+    return res
+
+
+class TripsWordIndex(object):
+    """
+    Prefix and fuzzy index over a set of words.
+
+    Words are kept in a sorted tuple, so completions of a prefix are a
+    contiguous range found by bisection.  Fuzzy lookups use symmetric
+    deletes (as in SymSpell): every string obtained by deleting up to
+    max_distance characters from the first prefix_length characters of a
+    word points back to the words with that prefix, so the candidates for a
+    query are found by generating the same deletes for the query.
+    Candidates are then checked with edit_distance.
+    """
+
+    def __init__(self, words, max_distance=2, prefix_length=7):
+        self.words = tuple(sorted({sys.intern(w.lower()) for w in words}))
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        # words sharing a prefix are contiguous, prefix k covers the words
+        # starts[k]:starts[k+1]
+        prefixes = []
+        starts = array('i')
+        for i, w in enumerate(self.words):
+            p = w[:prefix_length]
+            if not prefixes or prefixes[-1] != p:
+                prefixes.append(p)
+                starts.append(i)
+        starts.append(len(self.words))
+        self.starts = starts
+        deletes = {}
+        for k, p in enumerate(prefixes):
+            for d in _deletes(p, max_distance):
+                ids = deletes.get(d)
+                if ids is None:
+                    deletes[d] = k
+                elif type(ids) is int:
+                    deletes[d] = [ids, k]
+                else:
+                    ids.append(k)
+        self.deletes = {d: ids if type(ids) is int else array('i', ids) for d, ids in deletes.items()}
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        i = bisect_left(self.words, word)
+        return i < len(self.words) and self.words[i] == word
+
+    def complete(self, prefix, limit=None):
+        """words starting with prefix, in order"""
+        prefix = prefix.lower()
+        res = []
+        for i in range(bisect_left(self.words, prefix), len(self.words)):
+            w = self.words[i]
+            if not w.startswith(prefix) or (limit is not None and len(res) >= limit):
+                break
+            res.append(w)
+        return res
+
+    def fuzzy(self, word, distance=1):
+        """[(word, distance)] of every word within distance of word, closest
+        first.  distance can not be more than max_distance."""
+        if distance > self.max_distance:
+            raise ValueError("the index only supports distances up to {}".format(self.max_distance))
+        word = word.lower()
+        prefixes = set()
+        for d in _deletes(word[:self.prefix_length], distance):
+            ids = self.deletes.get(d)
+            if ids is None:
+                continue
+            if type(ids) is int:
+                prefixes.add(ids)
+            else:
+                prefixes.update(ids)
+        res = []
+        for k in prefixes:
+            for i in range(self.starts[k], self.starts[k + 1]):
+                w = self.words[i]
+                dist = edit_distance(word, w, limit=distance)
+                if dist <= distance:
+                    res.append((w, dist))
+        return sorted(res, key=lambda x: (x[1], x[0]))
@@ -1,5 +1,28 @@
 try:
-    import en_core_web_lg as nlp
-    nlp = nlp.load()
+    import spacy as _spacy
 except ImportError:
     raise ImportError("Install pytrips[tools]")
+
+_nlp = {}
+
+def load_nlp(model="en_core_web_lg"):
+    """Load a spacy model once per process, on first use rather than at import"""
+    if model not in _nlp:
+        _nlp[model] = _spacy.load(model)
+    return _nlp[model]
+
+
+class _LazyModel(object):
+    """Stands in for a spacy model and loads it when first used"""
+
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, attr):
+        return getattr(load_nlp(self._model), attr)
+
+    def __call__(self, *args, **kwargs):
+        return load_nlp(self._model)(*args, **kwargs)
+
+# `from pytrips.tools import nlp` still works, but only loads the model when used
+nlp = _LazyModel("en_core_web_lg")
@@ -1 +1,87 @@
+"""
+spaCy pipeline component that tags tokens with TRIPS type candidates.
 
+    from pytrips.tools import load_nlp
+    from pytrips.tools.spacy import add_trips_tagger
+
+    nlp = add_trips_tagger(load_nlp())
+    for doc in nlp.pipe(texts, batch_size=1000, n_process=4):
+        for token in doc:
+            token._.trips  # candidates from both the lexicon and wordnet
+
+n_process needs spaCy 2.2.2 or later, which the tools extra installs.
+
+Lookups go through the ontology's query cache, so each process resolves a
+(word, pos) pair once no matter how many documents it sees.  When the
+component is sent to another process it does not take its ontology along,
+the child loads its own from the compiled snapshot (see get_ontology).
+"""
+from spacy.tokens import Token
+
+from ..helpers import Normalize
+
+_extensions = ("trips", "trips_lex", "trips_wn")
+
+
+class TripsTagger(object):
+    """
+    Writes the TRIPS types for each token's text and lemma to
+    token._.trips_lex (lexicon), token._.trips_wn (wordnet mappings) and
+    token._.trips (both).  Tokens whose part of speech is not in wordnet get
+    empty lists.
+    """
+    name = "trips"
+
+    def __init__(self, ontology=None, skip_lexicon=False, use_gloss=False):
+        self._ontology = ontology
+        self._owned = ontology is None
+        self.skip_lexicon = skip_lexicon
+        self.use_gloss = use_gloss
+        for ext in _extensions:
+            if not Token.has_extension(ext):
+                Token.set_extension(ext, default=None)
+
+    @property
+    def ontology(self):
+        if self._ontology is None:
+            from ..ontology import get_ontology
+            self._ontology = get_ontology(skip_lexicon=self.skip_lexicon, use_gloss=self.use_gloss)
+        return self._ontology
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if self._owned:
+            state["_ontology"] = None
+        return state
+
+    def lookup(self, word, pos):
+        res = self.ontology[("q::" + word, pos)]
+        return res["lex"], res["wn"]
+
+    def tag(self, token):
+        # untagged, e.g. a pipeline without a tagger
+        if not token.tag_:
+            return [], []
+        pos = Normalize.spacy_pos(token.tag_)
+        if pos not in ("n", "v", "a", "r"):
+            return [], []
+        lex, wn = self.lookup(token.text.lower(), pos)
+        if token.lemma_ and token.lemma_ != token.text.lower():
+            llex, lwn = self.lookup(token.lemma_, pos)
+            lex = lex + [t for t in llex if t not in lex]
+            wn = wn + [t for t in lwn if t not in wn]
+        return lex, wn
+
+    def __call__(self, doc):
+        for token in doc:
+            lex, wn = self.tag(token)
+            token._.trips_lex = lex
+            token._.trips_wn = wn
+            token._.trips = lex + [t for t in wn if t not in lex]
+        return doc
+
+
+def add_trips_tagger(nlp, ontology=None, **kwargs):
+    """Add a TripsTagger to the end of nlp's pipeline and return nlp"""
+    nlp.add_pipe(TripsTagger(ontology=ontology, **kwargs), name=TripsTagger.name, last=True)
+    return nlp
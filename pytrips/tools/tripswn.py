@@ -1,5 +1,7 @@
-from ..helpers import get_wn_key, Normalize
+from ..helpers import get_wn_key, ss_to_sk, all_hypernyms, Normalize
 from ..structures import TripsType
+from array import array
+import heapq
 from nltk.corpus import wordnet as wn
 from nltk.corpus.reader.wordnet import Synset
 
@@ -8,12 +10,101 @@ def load(wn_weight=1.0, trips_weight=1.0):
     return TripsWN(ld(), wn_weight, trips_weight)
 
 
+class HybridPathStore(object):
+    """
+    Hybrid WordNet -> TRIPS paths stored as parent pointers.
+
+    Node i holds an item (a synset or a TripsType) and parent[i] is the next
+    node towards the TRIPS root, or -1.  Nodes are shared on (item, parent),
+    so all paths that reach a type share its path to root, and paths that
+    climb through the same hypernyms share those nodes too.  The paths of a
+    synset are computed once, without a depth cap, and recorded as
+    (number of synsets, start node, type) so any cap is a filter.
+    """
+
+    def __init__(self, ontology):
+        self.ontology = ontology
+        self.items = []
+        self.parent = array('i')
+        self._nodes = {}
+        self._types = {}
+        self._entries = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def _node(self, item, parent):
+        key = (item, parent)
+        i = self._nodes.get(key)
+        if i is None:
+            i = len(self.items)
+            self.items.append(item)
+            self.parent.append(parent)
+            self._nodes[key] = i
+        return i
+
+    def _type_node(self, t):
+        i = self._types.get(t)
+        if i is None:
+            i = -1
+            for x in reversed(t.path_to_root()):
+                j = self._types.get(x)
+                if j is None:
+                    j = self._types[x] = self._node(x, i)
+                i = j
+        return i
+
+    def _mapped(self, synset):
+        return self.ontology._wordnet_index.get(ss_to_sk(synset), ())
+
+    def entries(self, key, max_depth):
+        """(number of synsets, start node, type) of the paths of a synset
+        that climb at most max_depth synsets"""
+        entries = self._entries.get(key)
+        if entries is None:
+            entries = []
+            direct = self._mapped(key)
+            if direct:
+                entries = [(1, self._node(key, self._type_node(t)), t) for t in direct]
+            else:
+                for p in key.hypernym_paths():
+                    p = p[::-1]
+                    for i, s in enumerate(p):
+                        types = self._mapped(s)
+                        if not types:
+                            continue
+                        for t in types:
+                            n = self._type_node(t)
+                            for x in reversed(p[:i+1]):
+                                n = self._node(x, n)
+                            entries.append((i+1, n, t))
+                        break # don't go further up the path
+            entries = self._entries[key] = tuple(entries)
+        return [e for e in entries if e[0] <= max_depth]
+
+    def path(self, node, fill=True):
+        """the items from node up to the TRIPS root, or only up to the
+        first TRIPS type if fill is false"""
+        res = []
+        while node >= 0:
+            item = self.items[node]
+            res.append(item)
+            if not fill and type(item) is TripsType:
+                break
+            node = self.parent[node]
+        return res
+
+
 class TripsWN:
     # convenience object
     def __init__(self, ontology, wn_weight=5.0, trips_weight=1.0):
         self.ontology = ontology
         self.wn_weight = wn_weight
         self.trips_weight = trips_weight
+        # sense -> encoded hybrid paths, valid for the weights they were built with
+        self._paths = {}
+        self._paths_weights = (wn_weight, trips_weight)
+        self._path_store = None
 
     def __getattr__(self, attr):
         # see if this object has attr
@@ -49,12 +140,68 @@ class TripsWN:
             return []
         return [(s, min([self.path_weight(x, trips) for x in t])) for s, t in self.candidates_for_word_type(trips, word, pos).items()]
 
-    def get_wordnet(self, key, max_depth=-1, path=False, fill=False):
-        if fill and path: # can't fill without path
-            fill = lambda x: x.path_to_root()
-        else:
-            fill = lambda x: [x]
+    def ranked_candidates(self, trips, word, pos, k=5):
+        """
+        The k best (synset, type, weight) candidates of word under the type
+        trips, lowest weight first.  The weight is that of
+        weighted_candidates_for_word_type: wn_weight per synset climbed and
+        trips_weight per type between the synset's type and trips.
 
+        All synsets of the word are walked up the hypernym graph together in
+        order of weight, so the walk stops as soon as k candidates are known
+        to be better than anything left to explore.
+        """
+        if type(trips) is not TripsType:
+            trips = self.ontology[Normalize.ont_name(trips)]
+        if not trips or k <= 0:
+            return []
+        store = self.path_store
+        tdepth = trips.depth
+        # entries are (weight, order, synset, origin, depth) while walking and
+        # (weight, order, None, origin, type) once a type has been reached
+        heap = []
+        order = 0
+        for origin in wn.synsets(word, pos):
+            heap.append((self.wn_weight, order, origin, origin, 1))
+            order += 1
+        heapq.heapify(heap)
+        seen = set()
+        found = set()
+        res = []
+        while heap and len(res) < k:
+            weight, _, synset, origin, depth = heapq.heappop(heap)
+            if synset is None:
+                # the first time a candidate comes out is its lowest weight
+                if (origin, depth) not in found:
+                    found.add((origin, depth))
+                    res.append((origin, depth, weight))
+                continue
+            if (origin, synset) in seen:
+                continue
+            seen.add((origin, synset))
+            types = store._mapped(synset)
+            if types:
+                # don't go further up the path
+                for t in types:
+                    if t in trips:
+                        total = weight + self.trips_weight * (t.depth - tdepth)
+                        heapq.heappush(heap, (total, order, None, origin, t))
+                        order += 1
+            elif depth < self.max_wn_depth:
+                for h, _ in all_hypernyms(synset):
+                    heapq.heappush(heap, (weight + self.wn_weight, order, h, origin, depth + 1))
+                    order += 1
+        return res
+
+    @property
+    def path_store(self):
+        """The HybridPathStore behind get_wordnet, built as synsets are
+        looked up"""
+        if self._path_store is None:
+            self._path_store = HybridPathStore(self.ontology)
+        return self._path_store
+
+    def get_wordnet(self, key, max_depth=-1, path=False, fill=False):
         if max_depth == -1:
             max_depth = self.max_wn_depth
         elif max_depth == 0:
@@ -63,21 +210,10 @@ class TripsWN:
             key = get_wn_key(key)
         if not key:
             return []
-        if key in self._wordnet_index:
-            if not path:
-                return self._wordnet_index[key][:]
-            return [[key]+fill(t) for t in self._wordnet_index[key][:]]
-        else:
-            paths = [list(reversed(p[:max_depth])) for p in key.hypernym_paths()]
-            results = []
-            for p in paths:
-                for i in range(len(p)):
-                    if p[i] in self._wordnet_index:
-                        results += [p[:i+1] + fill(t) for t in self._wordnet_index[p[i]][:]]
-                        break # don't go further up the path
-            if not path:
-                return [x[-1] for x in results]
-            return results
+        entries = self.path_store.entries(key, max_depth)
+        if not path:
+            return [t for _, _, t in entries]
+        return [self.path_store.path(n, fill=fill) for _, n, _ in entries]
 
     def path_weight(self, path, stop=None):
         if stop and self.type_in_path(stop, path):
@@ -99,8 +235,10 @@ class TripsWN:
         if type(item) is str:
             if item.startswith("wn::"):
                 return self.get_wordnet(item[4:], path=True, fill=True)
-            else:
-                return [self.ontology.get[item].path_to_root()]
+            item = self.ontology[item]
+            if type(item) is TripsType:
+                return [item.path_to_root()]
+            return []
         elif type(item) is Synset:
             return self.get_wordnet(item, path=True, fill=True)
         elif type(item) is TripsType:
@@ -108,24 +246,59 @@ class TripsWN:
         else:
             return []
 
+    def hybrid_paths(self, sense):
+        """The paths to root of sense, encoded root first as (tokens, weights)
+        where weights[i] is the weight of the first i nodes.  Cached per
+        sense until the weights change."""
+        weights = (self.wn_weight, self.trips_weight)
+        if weights != self._paths_weights:
+            self._paths = {}
+            self._paths_weights = weights
+        res = self._paths.get(sense)
+        if res is None:
+            res = tuple(self._encode_path(p) for p in self.path_to_root(sense))
+            self._paths[sense] = res
+        return res
+
+    def _encode_path(self, path):
+        tokens = []
+        weights = [0]
+        for node in reversed(path):
+            tokens.append(node if type(node) is str else "wn::" + node.name() if type(node) is Synset else str(node))
+            weights.append(weights[-1] + self.node_weight(node))
+        return tuple(tokens), tuple(weights)
+
+    @staticmethod
+    def _path_score(path1, path2):
+        tokens1, weights1 = path1
+        tokens2, weights2 = path2
+        # the lcs is the shared part from the root down
+        n = min(len(tokens1), len(tokens2))
+        k = 0
+        while k < n and tokens1[k] == tokens2[k]:
+            k += 1
+        total = weights1[-1] + weights2[-1]
+        if not total:
+            return 0
+        return 2 * weights1[k] / total
+
+    def _cross_wup(self, paths1, paths2):
+        return max((self._path_score(a, b) for a in paths1 for b in paths2), default=0)
+
     def cross_wup(self, sense1, sense2, shortest_path_to_trips=True):
         if type(sense1) not in [TripsType, Synset]:
             return 0
         if type(sense2) not in [TripsType, Synset]:
             return 0
+        return self._cross_wup(self.hybrid_paths(sense1), self.hybrid_paths(sense2))
 
-        ptr1 = self.path_to_root(sense1)
-        ptr2 = self.path_to_root(sense2)
-
-        def score(path1, path2):
-            lcs = self.get_lcs_path(path1, path2)
-            lcs_weight = self.path_weight(lcs)
-            try:
-                return 2*lcs_weight/(self.path_weight(path1) + self.path_weight(path2))
-            except:
-                return 0
-        max_list = lambda x: max([score(x, y) for y in ptr2])
-        return max([max_list(a) for a in ptr1])
+    def cross_wup_matrix(self, senses_a, senses_b):
+        """cross_wup between every sense in senses_a and every sense in
+        senses_b, as a list of rows.  Paths are enumerated once per sense."""
+        valid = lambda s: type(s) in (TripsType, Synset)
+        paths_a = [self.hybrid_paths(s) if valid(s) else () for s in senses_a]
+        paths_b = [self.hybrid_paths(s) if valid(s) else () for s in senses_b]
+        return [[self._cross_wup(a, b) for b in paths_b] for a in paths_a]
 
     def node_weight(self, node):
         if type(node) is Synset:
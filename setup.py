@@ -6,9 +6,12 @@ with open("README.md", "r") as fh:
 
 extras = {
     "tools": [
-        'spacy>=2.0.0,<3.0.0',
-        'en_core_web_lg==2.1.0',
-        ]
+        'spacy>=2.2.2,<2.3.0',
+        'en_core_web_lg==2.2.5',
+        ],
+    "similarity": [
+        'numpy',
+        ],
     }
 
 base = [
@@ -37,4 +40,7 @@ if __name__ == '__main__':
         ],
         install_requires=base,
         extras_require=extras,
+        entry_points={
+            "console_scripts": ["pytrips=pytrips.cli:main"],
+        },
     )
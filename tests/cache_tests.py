@@ -0,0 +1,104 @@
+import multiprocessing
+import pickle
+
+import pytest
+
+from . import trips
+from pytrips.cache import QueryCache, query_namespace, persistent_key, MISSING
+from pytrips.ontology import Trips
+from pytrips.snapshot import snapshot_key
+
+
+def test_namespaces():
+    assert query_namespace("w::bread") == "w"
+    assert query_namespace(("q::move", "v")) == "q"
+    assert query_namespace("ont::bread") == "ont"
+    assert query_namespace("bread") == "ont"
+    assert query_namespace(trips["bread"]) == "ont"
+
+
+def test_lru_eviction_per_namespace():
+    cache = QueryCache(maxsize=2, limits={"q": 1})
+    cache.put("w::a", 1)
+    cache.put("w::b", 2)
+    assert cache.get("w::a") == 1
+    cache.put("w::c", 3)
+    assert "w::b" not in cache
+    assert "w::a" in cache
+    cache.put("q::a", 1)
+    cache.put("q::b", 2)
+    assert cache.get("q::a") is MISSING
+    stats = cache.stats()
+    assert stats["w"]["evictions"] == 1
+    assert stats["q"]["evictions"] == 1
+    assert stats["q"]["misses"] == 1
+    assert stats["w"]["hits"] == 1
+
+
+def test_resize_and_clear():
+    cache = QueryCache(maxsize=None)
+    for i in range(10):
+        cache.put("w::%d" % i, i)
+    assert len(cache) == 10
+    cache.resize(4, namespace="w")
+    assert len(cache) == 4
+    assert "w::9" in cache
+    cache.clear()
+    assert len(cache) == 0
+    assert pickle.loads(pickle.dumps(cache)).limit("w") == 4
+
+
+def test_trips_uses_cache():
+    trips.cache.clear()
+    trips["w::bread"]
+    trips["w::bread"]
+    assert trips.cache.stats()["w"]["hits"] >= 1
+
+
+def test_persistent_keys():
+    assert persistent_key("W::Bread") == persistent_key("w::bread")
+    assert persistent_key(("w::bread", "n")) != persistent_key("w::bread")
+    assert persistent_key("ont::bread") is None
+    assert persistent_key("q::bread") is None
+
+
+def _query(words):
+    # lexicon queries and stored lookups only, forked processes can not
+    # read wordnet files concurrently
+    res = [trips["w::" + w] for w in words]
+    trips.lookup("cat", "n")
+    return len(res), trips.persistent_cache.hits
+
+
+def test_persistent_cache(tmp_path):
+    path = str(tmp_path / "queries.sqlite")
+    try:
+        store = trips.persist_cache(path, version="test")
+        trips.cache.clear()
+        bread = trips["w::bread"]
+        cat = trips.lookup("cat", "n")
+        assert len(store) == 2
+        trips.cache.clear()
+        assert trips["w::bread"] == bread
+        assert trips.lookup("cat", "n") == cat
+        assert store.hits == 2
+        # written concurrently by other processes
+        with multiprocessing.get_context("fork").Pool(2) as pool:
+            res = pool.map(_query, [["dog", "fish"], ["tree", "fish"]])
+        assert all(hits > store.hits for _, hits in res)
+        assert len(store) == 5
+        # other versions do not see them
+        assert len(trips.persist_cache(path, version="other")) == 0
+    finally:
+        trips.persist_cache(False)
+        trips.cache.clear()
+
+
+def test_persistent_cache_version(tmp_path):
+    path = str(tmp_path / "queries.sqlite")
+    try:
+        assert trips.persist_cache(path).version == snapshot_key()
+    finally:
+        trips.persist_cache(False)
+    with pytest.raises(ValueError):
+        Trips().persist_cache(path)
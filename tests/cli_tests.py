@@ -0,0 +1,35 @@
+import io
+import json
+
+from pytrips.cli import answer, _chunks
+from pytrips.ontology import Trips
+
+from . import trips
+
+lines = ['"w::bread"', '["w::bread", "n"]', '{"query": "q::run", "pos": "v"}', '"food"', '', 'not json',
+         '["w::bread", ["n"]]', '{"query": ["x"]}', '[1, 2, 3]']
+
+
+def test_answer():
+    out, stats = answer(trips, lines)
+    res = [json.loads(l) for l in out]
+    assert len(res) == 8
+    assert res[0]["result"] == [str(t) for t in trips["w::bread"]]
+    assert res[1]["pos"] == "n"
+    assert set(res[2]["result"]) == {"lex", "wn"}
+    assert res[3]["result"] == "ont::food"
+    assert all("error" in r and "input" in r for r in res[4:])
+    assert stats["w"][0] == 2 and stats["q"][0] == 1 and stats["ont"][0] == 1
+
+
+def test_result_roundtrip():
+    res = trips[("q::run", "v")]
+    loaded = trips.load_result(json.loads(json.dumps(Trips.dump_result(res))))
+    assert {k: set(v) for k, v in loaded.items()} == {k: set(v) for k, v in res.items()}
+    assert trips.load_result("ont::food") is trips["food"]
+
+
+def test_chunks_are_bounded():
+    chunks = _chunks(iter(range(10)), 4)
+    assert next(chunks) == [0, 1, 2, 3]
+    assert [len(c) for c in chunks] == [4, 2]
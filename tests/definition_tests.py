@@ -0,0 +1,23 @@
+from . import trips
+
+
+def test_definition_references():
+    users = trips["d::device"]
+    assert users
+    for name in users:
+        t = trips[name]
+        assert "DEVICE" in str(t.definitions)
+
+
+def test_definition_references_descendants():
+    direct = set(trips["d::device"])
+    below = set(trips.get_definition("d::device", descendants=True))
+    assert direct <= below
+    for name in below - direct:
+        t = trips[name]
+        referenced = [x for x in trips._definition_index if name in ["ont::" + n for n in trips._definition_index[x]]]
+        assert any(trips[r] in trips["device"] for r in referenced)
+
+
+def test_definition_query_ignores_pos():
+    assert trips[("d::device", "n")] == trips["d::device"]
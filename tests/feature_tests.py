@@ -0,0 +1,29 @@
+import pytest
+
+from . import trips
+
+
+def _scan(types, feature, value):
+    return {t for t in types if t.sem and str(t.sem.sem.get(feature, "")).lower() == value}
+
+
+@pytest.mark.parametrize("feature,value", [("mobility", "movable"), ("origin", "human")])
+def test_single_feature(feature, value):
+    assert set(trips.get_types_with_features({feature: value})) == _scan(trips, feature, value)
+
+
+def test_within_subtree():
+    within = trips["phys-object"]
+    res = trips.get_types_with_features({":mobility": "MOVABLE"}, within="ont::phys-object")
+    assert res and set(res) == _scan(within.path[-1:] + within.descendants, "mobility", "movable")
+
+
+def test_conjunction_and_disjunction():
+    human = set(trips.get_types_with_features({"origin": "human"}))
+    moving = set(trips.get_types_with_features({"mobility": ["self-moving", "movable"]}))
+    both = trips.get_types_with_features({"origin": "human", "mobility": ["self-moving", "movable"]})
+    either = trips.get_types_with_features({"origin": "human", "mobility": ["self-moving", "movable"]}, match="any")
+    assert set(both) == human & moving
+    assert set(either) == human | moving
+    assert [t.id for t in both] == sorted(t.id for t in both)
+    assert trips.get_types_with_features({"origin": "nowhere"}) == []
@@ -3,3 +3,42 @@ from pytrips.helpers import Normalize
 def test_nmlz_ont():
     assert Normalize.ont_name("test") == "ont::test"
     assert Normalize.ont_name("ont::test") == "ont::test"
+
+from pytrips.helpers import get_wn_key, ss_to_sk, resolve_wn_keys, seed_wn_keys, clear_wn_key_cache
+from pytrips.helpers import helpers
+
+def test_wn_key_cache():
+    clear_wn_key_cache()
+    cat = get_wn_key("cat%1:05:00::")
+    assert cat.name() == "cat.n.01"
+    assert get_wn_key("wn::cat%1:05:00") is cat
+    assert get_wn_key("nonsense%1:05:00::") is None
+    assert ss_to_sk(cat) == "cat%1:05:00::"
+
+def test_wn_key_seed():
+    offsets = resolve_wn_keys(["cat%1:05:00::", "nonsense%1:05:00::"])
+    clear_wn_key_cache()
+    seed_wn_keys(offsets)
+    assert get_wn_key("cat%1:05:00::").name() == "cat.n.01"
+    assert get_wn_key("nonsense%1:05:00::") is None
+
+
+def test_wn_key_cache_is_bounded(monkeypatch):
+    clear_wn_key_cache()
+    monkeypatch.setattr(helpers, "KEY_CACHE_SIZE", 1)
+    get_wn_key("nonsense%1:05:00::")
+    assert list(helpers._key_synsets) == ["nonsense%1:05:00::"]
+    get_wn_key("wn::cat%1:05:00")
+    assert list(helpers._key_synsets) == ["cat%1:05:00::"]
+    assert get_wn_key("dog%1:05:00::").name() == "dog.n.01"
+    assert list(helpers._key_synsets) == ["dog%1:05:00::"]
+
+
+def test_wn_key_miss_is_cached(monkeypatch):
+    clear_wn_key_cache()
+    calls = []
+    resolve = helpers._resolve_wn_key
+    monkeypatch.setattr(helpers, "_resolve_wn_key", lambda k: calls.append(k) or resolve(k))
+    assert get_wn_key("nonsense%1:05:00::") is None
+    assert get_wn_key("wn::nonsense%1:05:00") is None
+    assert calls == ["nonsense%1:05:00::"]
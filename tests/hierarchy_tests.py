@@ -0,0 +1,43 @@
+from . import trips
+
+
+def test_labelling_is_preorder():
+    h = trips._hierarchy
+    assert h.names[0] == "root"
+    for i, name in enumerate(h.names):
+        t = trips[name]
+        assert t.id == i
+        if i:
+            assert h.parent[i] < i
+            assert str(trips[h.names[h.parent[i]]]) == str(t.parent)
+
+
+def test_subsumption_matches_paths():
+    food = trips["food"]
+    for t in trips.get_word("bread") + [trips["bread"], trips["geo-object"]]:
+        assert (food > t) == (food in t.path_to_root()[1:])
+        assert (t < food) == (food > t)
+        assert (t in food) == (food in t.path_to_root())
+
+
+def test_subsumption_max_depth():
+    assert trips["baked-goods"].subsumes(trips["bread"], max_depth=0)
+    assert trips["food"].subsumes(trips["bread"], max_depth=2)
+    assert not trips["food"].subsumes(trips["bread"], max_depth=1)
+
+
+def test_root_is_not_subsumed():
+    assert not trips["bread"] > trips["root"]
+    assert trips["root"] > trips["bread"]
+    assert "ont::bread" in trips["food"]
+
+
+def test_lcs_matches_paths():
+    pairs = [("bread", "geo-object"), ("bread", "food"), ("person", "mammal"), ("move", "bread")]
+    for a, b in pairs:
+        a, b = trips[a], trips[b]
+        common = [t for t in a.path_to_root() if t in b.path_to_root()]
+        assert (a ^ b) == common[0]
+        assert a.depth == len(a.path_to_root()) - 1
+        assert a.path_len(b) == a.depth + b.depth - 2 * common[0].depth
+        assert a.wup(b) == 2 * common[0].depth / (a.depth + b.depth)
@@ -0,0 +1,34 @@
+from . import trips
+
+queries = [("cat", "n"), ("move", "v"), ("cat", "n"), ("bread", "n"), ("q::run", "v"), ("move", "v")]
+
+
+def _names(res):
+    return {k: sorted(str(t) for t in v) for k, v in res.items()}
+
+
+def test_lookup_many_matches_lookup():
+    expected = [_names(trips.lookup(w, p)) for w, p in queries]
+    assert [_names(r) for r in trips.lookup_many(queries)] == expected
+
+
+def test_lookup_many_workers():
+    expected = [_names(trips.lookup(w, p)) for w, p in queries]
+    res = trips.lookup_many(queries, workers=2, chunksize=1)
+    assert [_names(r) for r in res] == expected
+    assert res[0]["lex"][0] is trips[str(res[0]["lex"][0])]
+
+
+def test_part_of_speech_index():
+    nouns = trips.get_part_of_speech("p::n", lex=False)
+    assert type(nouns) is tuple and len(set(nouns)) == len(nouns)
+    assert trips["bread"] in nouns
+    words = trips.get_part_of_speech("n", lex=True)
+    assert "bread" in words and list(words) == sorted(words)
+    assert trips.get_part_of_speech("p::nope", lex=False) == ()
+    assert len(trips.all_words) == sum(len(w) for w in trips._words.values())
+
+
+def test_unknown_words_are_not_indexed():
+    assert trips.get_word("notaword", pos="n") == []
+    assert "notaword" not in trips._words["n"]
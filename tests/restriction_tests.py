@@ -0,0 +1,24 @@
+from . import trips
+
+
+def test_restrictions_are_resolved():
+    catch = trips["catch"]
+    agent = [r for r in catch.arguments if r.role == "agent"][0]
+    assert agent.fltypes == ("phys-obj",)
+    result = [r for r in catch.arguments if r.role == "result"][0]
+    assert result.restrictions and all(t.id in result.ids for t in result.restrictions)
+
+
+def test_satisfies():
+    assert trips.satisfies("person", "catch", ":agent")
+    assert trips.satisfies(trips["person"], trips["catch"], "AGENT")
+    assert not trips.satisfies("bread", "catch", "affected")
+    assert not trips.satisfies("person", "catch", "no-such-role")
+
+
+def test_accepting_slots_matches_scan():
+    for filler in ["person", "bread", "path"]:
+        filler = trips[filler]
+        scan = {(t, r.role) for t in trips for r in t.arguments if r.satisfied_by(filler)}
+        assert set(trips.accepting_slots(filler)) == scan
+    assert (trips["catch"], "agent") in trips.accepting_slots("person")
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from pytrips.server import TripsServer, TripsClient
+
+from . import trips
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def _session(path):
+    server = TripsServer(trips, batch_delay=0.01)
+    await server.start(path=path)
+    client = await TripsClient.connect(path=path)
+    try:
+        res = await asyncio.gather(
+            client.query("w::bread"),
+            client.query("w::bread"),
+            client.lookup("cat", "n"),
+            client.lookup("cat", "n"),
+            client.lookup("dog", "n"),
+            client.subsumes("food", "bread"),
+            client.similarity("food", "bread", metric="wup"),
+        )
+        with pytest.raises(ValueError):
+            await client.subsumes("food", "no-such-type")
+        return res, server.stats
+    finally:
+        await client.close()
+        await server.close()
+
+
+def test_server(tmp_path):
+    res, stats = _run(_session(str(tmp_path / "trips.sock")))
+    bread, bread2, cat, cat2, dog, subsumes, wup = res
+    assert bread == bread2 == [str(t) for t in trips["w::bread"]]
+    assert set(cat["lex"]) == {str(t) for t in trips.lookup("cat", "n")["lex"]}
+    assert cat == cat2 and dog != cat
+    assert subsumes is True
+    assert wup == trips["food"].wup(trips["bread"])
+    # identical requests in flight share one answer
+    assert stats["coalesced"] == 2
+    assert stats["answered"] == stats["requests"] - stats["coalesced"]
+    assert stats["batches"] < stats["answered"]
+
+
+async def _malformed(path):
+    server = TripsServer(trips, batch_delay=0)
+    answer = server.answer
+    failed = []
+
+    def fail_once(requests):
+        # an error the request handlers do not expect
+        if not failed:
+            failed.append(requests)
+            raise RuntimeError("boom")
+        return answer(requests)
+    server.answer = fail_once
+    await server.start(path=path)
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        replies = []
+        for request in ['{"id": 1, "op": "lookup", "args": ["cat"]}',
+                        '{"id": 2, "op": "query", "args": {"query": "w::dog"}}',
+                        '{"id": 3, "op": "query", "args": {"query": "w::cat"}}']:
+            writer.write((request + "\n").encode("utf-8"))
+            await writer.drain()
+            replies.append(json.loads((await reader.readline()).decode("utf-8")))
+        return replies
+    finally:
+        writer.close()
+        await server.close()
+
+
+def test_server_survives_bad_requests(tmp_path):
+    bad, failed, good = _run(_malformed(str(tmp_path / "trips.sock")))
+    assert bad["id"] == 1 and "error" in bad
+    assert failed["id"] == 2 and "RuntimeError" in failed["error"]
+    assert good["id"] == 3 and good["result"] == [str(t) for t in trips["w::cat"]]
@@ -0,0 +1,65 @@
+import pickle
+
+from . import trips
+from pytrips.shared import write_shared, SharedOntology
+
+
+def test_shared_roundtrip(tmp_path):
+    path = str(tmp_path / "ontology.shared")
+    write_shared(trips, path)
+    ont = SharedOntology(path).ontology
+    assert ont["bread"].id == trips["bread"].id
+    assert ont["bread"].parent == trips["bread"].parent
+    assert ont["bread"] < ont["food"]
+    assert (ont["bread"] ^ ont["geo-object"]) == (trips["bread"] ^ trips["geo-object"])
+    assert set(map(str, ont["w::bread"])) == set(map(str, trips["w::bread"]))
+    assert set(map(str, ont["wn::cat%1:05:00::"])) == set(map(str, trips["wn::cat%1:05:00::"]))
+    assert ont["d::device"] == trips["d::device"]
+    assert ont["not-a-type"] is None
+    assert ont["w::not-a-word"] == []
+
+
+def test_shared_words(tmp_path):
+    path = str(tmp_path / "ontology.shared")
+    write_shared(trips, path)
+    ont = SharedOntology(path).ontology
+    assert "bread" in ont._words["n"]
+    assert "zzzqqq" not in ont._words["n"]
+    assert ont._words["n"]["bread"] == tuple(sorted(trips._words["n"]["bread"]))
+    assert [str(t) for t in ont.get_word("bread", pos="n")] == [str(t) for t in trips.get_word("bread", pos="n")]
+    # the index only depends on the words, share it to save building it
+    ont._word_index = trips.word_index()
+    assert ont.closest_words("braed", 1, "n") == trips.closest_words("braed", 1, "n")
+    assert set(map(str, ont.get_word("braed", pos="n", fuzzy=1))) == \
+        set(map(str, trips.get_word("braed", pos="n", fuzzy=1)))
+
+
+def test_shared_pickle(tmp_path):
+    path = str(tmp_path / "ontology.shared")
+    write_shared(trips, path)
+    ont = SharedOntology(path).ontology
+    ont.cache.resize(10, namespace="w")
+    copy = pickle.loads(pickle.dumps(ont))
+    assert copy._shared_path == path
+    assert copy["bread"].id == trips["bread"].id
+    assert copy.cache.limit("w") == 10
+
+
+def test_shared_indexes(tmp_path):
+    path = str(tmp_path / "ontology.shared")
+    write_shared(trips, path)
+    ont = SharedOntology(path).ontology
+    bread, food = ont["bread"], ont["food"]
+    assert str(bread.significant()) == str(trips["bread"].significant())
+    assert [str(t) for t in bread.significant_ancestors()] == \
+        [str(t) for t in trips["bread"].significant_ancestors()]
+    assert food.subsumes(bread, significant=True) == trips["food"].subsumes(trips["bread"], significant=True)
+    query = {"origin": "human", "mobility": ["self-moving", "movable"]}
+    found = ont.get_types_with_features(query)
+    assert [t.id for t in found] == [t.id for t in trips.get_types_with_features(query)]
+    assert ont.feature_index().features() == trips.feature_index().features()
+    # only the types that were asked for or returned are unpickled
+    assert len(ont._data._types) <= len(found) + 20
+    slots = ont.accepting_slots("person")
+    assert {(str(t), r) for t, r in slots} == {(str(t), r) for t, r in trips.accepting_slots("person")}
+    assert len(ont._data._types) <= len(found) + len({t for t, _ in slots}) + 20
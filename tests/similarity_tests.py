@@ -0,0 +1,28 @@
+import pytest
+
+from . import trips
+
+np = pytest.importorskip("numpy")
+
+names = ["bread", "food", "geo-object", "person", "mammal", "move", "root"]
+
+
+def test_matrix_matches_pairwise():
+    a = [trips[n] for n in names]
+    b = ["ont::" + n for n in reversed(names[:-1])]
+    wup = trips.similarity_matrix(a, b)
+    cosine = trips.similarity_matrix(a, b, metric="cosine")
+    path_len = trips.similarity_matrix(a, b, metric="path_len")
+    assert wup.shape == (len(a), len(b))
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            y = trips[y]
+            assert path_len[i, j] == x.path_len(y)
+            assert wup[i, j] == pytest.approx(x.wup(y))
+            if x.depth:
+                assert cosine[i, j] == pytest.approx(x.cosine(y))
+
+
+def test_unknown_type():
+    with pytest.raises(ValueError):
+        trips.similarity_matrix(["bread"], ["not-a-type"])
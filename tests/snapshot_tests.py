@@ -0,0 +1,28 @@
+import pickle
+
+from . import trips
+from pytrips.snapshot import write_snapshot, read_snapshot
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = str(tmp_path / "ontology.pickle")
+    write_snapshot(trips, path)
+    ont = read_snapshot(path)
+    assert ont is not None
+    assert ont["bread"].parent == trips["bread"].parent
+    assert set(ont["w::bread"]) == set(trips["w::bread"])
+    assert ont["bread"] < ont["food"]
+
+
+def test_snapshot_options_must_match(tmp_path):
+    path = str(tmp_path / "ontology.pickle")
+    write_snapshot(trips, path)
+    assert read_snapshot(path, use_gloss=True) is None
+
+
+def test_snapshot_stale_header(tmp_path):
+    path = str(tmp_path / "ontology.pickle")
+    with open(path, "wb") as out:
+        pickle.dump({"format": -1}, out)
+        pickle.dump(None, out)
+    assert read_snapshot(path) is None
@@ -0,0 +1,52 @@
+import pytest
+
+spacy = pytest.importorskip("spacy")
+
+from pytrips.tools.spacy import TripsTagger, add_trips_tagger
+
+from . import trips
+
+
+def _doc(nlp, words, tags):
+    # a blank pipeline stands in for the model, tags are set by hand
+    doc = nlp.make_doc(" ".join(words))
+    for token, tag in zip(doc, tags):
+        token.tag_ = tag
+    return doc
+
+
+def test_tagger():
+    nlp = add_trips_tagger(spacy.blank("en"), ontology=trips)
+    tagger = nlp.get_pipe(TripsTagger.name)
+    doc = tagger(_doc(nlp, ["the", "cat", "sleeps"], ["DT", "NN", "VBZ"]))
+    the, cat, sleeps = doc
+    assert the._.trips == [] and the._.trips_lex == []
+    res = trips[("q::cat", "n")]
+    assert cat._.trips_lex == res["lex"]
+    assert cat._.trips_wn == res["wn"]
+    assert set(cat._.trips) == set(res["lex"]) | set(res["wn"])
+    assert sleeps._.trips
+
+
+def test_untagged_tokens():
+    nlp = add_trips_tagger(spacy.blank("en"), ontology=trips)
+    doc = nlp.get_pipe(TripsTagger.name)(nlp.make_doc("the cat"))
+    assert [t._.trips for t in doc] == [[], []]
+    assert [t._.trips_wn for t in doc] == [[], []]
+
+
+def test_tagger_uses_query_cache():
+    nlp = add_trips_tagger(spacy.blank("en"), ontology=trips)
+    tagger = nlp.get_pipe(TripsTagger.name)
+    tagger(_doc(nlp, ["bread"], ["NN"]))
+    hits = trips.cache.stats()["q"]["hits"]
+    tagger(_doc(nlp, ["bread"], ["NN"]))
+    assert trips.cache.stats()["q"]["hits"] > hits
+
+
+def test_tagger_state():
+    # a tagger that loaded its own ontology leaves it behind
+    owned = TripsTagger()
+    owned._ontology = trips
+    assert owned.__getstate__()["_ontology"] is None
+    assert TripsTagger(ontology=trips).__getstate__()["_ontology"] is trips
@@ -0,0 +1,46 @@
+from . import trips
+
+
+def test_records_are_not_copied():
+    bread = trips["bread"]
+    assert bread.words is bread.words
+    assert bread.wordnet is bread.wordnet
+    assert bread.arguments is bread.arguments
+    assert bread.definitions is bread.definitions
+    assert type(bread.definitions) is tuple
+
+
+def test_navigation():
+    bread = trips["bread"]
+    assert bread.path[-1] == bread
+    assert list(bread.ancestors) == list(reversed(bread.path_to_root()[1:]))
+    assert bread.root == trips["root"]
+    assert trips["root"].is_root
+    food = trips["food"]
+    assert bread in food.descendants
+    assert all(t in food for t in food.descendants)
+    assert all(t.is_leaf for t in food.leaves)
+    assert food not in food.siblings
+    assert food.height >= bread.depth - food.depth
+
+
+def test_hash_matches_equality():
+    bread, food = trips["bread"], trips["food"]
+    assert bread == "ont::bread" and hash(bread) == hash("ont::bread")
+    assert "ont::bread" in {bread}
+    assert len({bread, food, trips["ont::bread"]}) == 2
+    assert bread != food
+
+
+def test_significance():
+    food = trips["food"]
+    sig = food.significant()
+    assert sig == food or not food.differs_semantically_from(food.parent)
+    assert all(c.differs_semantically_from(food) for c in food.significant_children())
+    for d in food.significant_descendants():
+        assert d in food and d.significant() == d
+        assert d.differs_semantically_from(d.parent)
+        assert sig.subsumes(d, significant=True)
+        assert not d.subsumes(food, significant=True)
+    assert trips["root"] not in food.significant_ancestors()
+    assert food.significant_parent() == food.significant_ancestors()[1 if sig == food else 0]
@@ -0,0 +1,135 @@
+import pytest
+
+pytest.importorskip("spacy")
+
+from nltk.corpus import wordnet as wn
+from nltk.corpus.reader.wordnet import Synset
+
+from pytrips.helpers import ss_to_sk
+from pytrips.tools.tripswn import TripsWN
+
+from . import trips
+
+twn = TripsWN(trips)
+
+synsets = [s for w in ["cat", "dog", "bread", "house", "run", "take", "eat", "walk"]
+           for pos in "nv" for s in wn.synsets(w, pos)]
+
+
+def _walk(synset, max_depth, fill):
+    """hybrid paths of synset, walking each hypernym path up from synset to
+    the first mapped synset"""
+    res = set()
+    for p in synset.hypernym_paths():
+        p = p[::-1][:max_depth]
+        for i, s in enumerate(p):
+            types = trips._wordnet_index.get(ss_to_sk(s), ())
+            if types:
+                for t in types:
+                    res.add(tuple(p[:i+1]) + tuple(t.path_to_root() if fill else [t]))
+                break
+    return res
+
+
+@pytest.mark.parametrize("max_depth", [1, 2, 3, 5])
+def test_get_wordnet_paths(max_depth):
+    for s in synsets:
+        for fill in (True, False):
+            paths = twn.get_wordnet(s, max_depth=max_depth, path=True, fill=fill)
+            assert {tuple(p) for p in paths} == _walk(s, max_depth, fill)
+        types = twn.get_wordnet(s, max_depth=max_depth)
+        assert set(types) == {p[-1] for p in _walk(s, max_depth, False)}
+
+
+def test_get_wordnet_depth_cap():
+    assert twn.get_wordnet(synsets[0], max_depth=0) == []
+    assert twn.get_wordnet(synsets[0]) == twn.get_wordnet(synsets[0], max_depth=trips.max_wn_depth)
+    # the cap counts synsets from the key up, not from the root down
+    for s in synsets:
+        depths = [sum(1 for x in p if type(x) is Synset)
+                  for p in twn.get_wordnet(s, max_depth=3, path=True)]
+        assert all(d <= 3 for d in depths)
+        deeper = [e[0] for e in twn.path_store.entries(s, 10)]
+        if deeper and min(deeper) > 1:
+            d = min(deeper)
+            assert twn.get_wordnet(s, max_depth=d - 1) == []
+            assert twn.get_wordnet(s, max_depth=d)
+
+
+def test_path_to_root():
+    food = trips["food"]
+    assert twn.path_to_root("ont::food") == [food.path_to_root()]
+    assert twn.path_to_root(food) == [food.path_to_root()]
+    assert twn.path_to_root("ont::not-a-type") == []
+    cat = wn.synset("cat.n.01")
+    assert twn.path_to_root(cat) == twn.get_wordnet(cat, path=True, fill=True)
+
+
+senses = [trips["food"], trips["bread"], trips["animal"], trips["move"]] + \
+    [wn.synset(s) for s in ["cat.n.01", "dog.n.01", "bread.n.01", "house.n.01", "run.v.01", "eat.v.01"]]
+
+
+def _position_wise_wup(twn, sense1, sense2):
+    """cross_wup as it was scored before paths were cached: the lcs is every
+    position where the paths agree, counting from the root"""
+    def score(path1, path2):
+        lcs = twn.get_lcs_path(path1, path2)
+        total = twn.path_weight(path1) + twn.path_weight(path2)
+        return 2 * twn.path_weight(lcs) / total if total else 0
+    return max((score(a, b) for a in twn.path_to_root(sense1) for b in twn.path_to_root(sense2)), default=0)
+
+
+def test_cross_wup():
+    for a in senses:
+        for b in senses:
+            assert twn.cross_wup(a, b) == pytest.approx(_position_wise_wup(twn, a, b))
+    assert twn.cross_wup(trips["bread"], trips["bread"]) == pytest.approx(1)
+
+
+def test_cross_wup_matrix():
+    matrix = twn.cross_wup_matrix(senses, senses[::-1])
+    assert matrix == [[twn.cross_wup(a, b) for b in senses[::-1]] for a in senses]
+
+
+def test_cross_wup_without_paths():
+    unmapped = next(s for s in synsets if not twn.get_wordnet(s))
+    assert twn.hybrid_paths(unmapped) == ()
+    assert twn.cross_wup(unmapped, senses[0]) == 0
+    assert twn.cross_wup("not a sense", senses[0]) == 0
+    assert twn.cross_wup_matrix([unmapped, "not a sense"], senses[:2]) == [[0, 0], [0, 0]]
+
+
+def test_hybrid_paths_follow_weights():
+    weighted = TripsWN(trips)
+    cat, food = wn.synset("cat.n.01"), trips["food"]
+    before = weighted.cross_wup(cat, food)
+    weighted.wn_weight = 1.0
+    weighted.trips_weight = 3.0
+    assert weighted.hybrid_paths(cat) == TripsWN(trips, 1.0, 3.0).hybrid_paths(cat)
+    assert weighted.cross_wup(cat, food) == pytest.approx(TripsWN(trips, 1.0, 3.0).cross_wup(cat, food))
+    assert weighted.cross_wup(cat, food) != pytest.approx(before)
+
+
+@pytest.mark.parametrize("word", ["take", "make", "set", "run"])
+def test_ranked_candidates(word):
+    for target in ["event-of-action", "motion"]:
+        ranked = twn.ranked_candidates(target, word, "v", k=1000)
+        best = {}
+        for s, t, weight in ranked:
+            assert t in trips[target]
+            best[s] = min(best.get(s, weight), weight)
+        assert best == dict(twn.weighted_candidates_for_word_type(target, word, "v"))
+        weights = [weight for _, _, weight in ranked]
+        assert weights == sorted(weights)
+        assert len(set((s, t) for s, t, _ in ranked)) == len(ranked)
+        # the top k are a prefix of the full ranking, up to ties
+        top = twn.ranked_candidates(target, word, "v", k=3)
+        assert len(top) == min(3, len(ranked))
+        assert [weight for _, _, weight in top] == weights[:len(top)]
+
+
+def test_ranked_candidates_edge_cases():
+    assert twn.ranked_candidates("not-a-type", "run", "v") == []
+    assert twn.ranked_candidates("motion", "run", "v", k=0) == []
+    assert twn.ranked_candidates("motion", "zzzqqq", "v") == []
+    assert twn.ranked_candidates(trips["motion"], "run", "v") == twn.ranked_candidates("ont::motion", "run", "v")
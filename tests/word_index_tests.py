@@ -0,0 +1,36 @@
+import pytest
+
+from pytrips.structures import TripsWordIndex, edit_distance
+
+from . import trips
+
+words = ["bread", "breed", "bred", "brad", "bead", "cat", "cart", "catalogue", "catamaran", "dog"]
+
+
+@pytest.mark.parametrize("a,b,d", [("kitten", "sitting", 3), ("abcd", "abdc", 1), ("", "abc", 3), ("same", "same", 0)])
+def test_edit_distance(a, b, d):
+    assert edit_distance(a, b) == d
+    assert edit_distance(a, b, limit=1) == min(d, 2)
+
+
+def test_fuzzy_matches_scan():
+    index = TripsWordIndex(words, max_distance=2)
+    for query in ["bred", "brea", "cta", "catamara", "xyz", "dgo"]:
+        scan = sorted((w, edit_distance(query, w)) for w in words if edit_distance(query, w) <= 2)
+        assert sorted(index.fuzzy(query, 2)) == scan
+    with pytest.raises(ValueError):
+        TripsWordIndex(words, max_distance=1).fuzzy("bred", 2)
+
+
+def test_complete():
+    index = TripsWordIndex(words)
+    assert index.complete("cat") == ["cat", "catalogue", "catamaran"]
+    assert index.complete("cat", limit=1) == ["cat"]
+    assert index.complete("zebra") == []
+
+
+def test_fuzzy_lookup():
+    assert trips.get_word("bread", pos="n", fuzzy=1) == trips.get_word("bread", pos="n")
+    assert trips["bread"] in trips.get_word("braed", pos="n", fuzzy=1)
+    assert trips["bread"] in trips.lookup("braed", "n", fuzzy=1)["lex"]
+    assert "bread" in trips.complete("brea", limit=None)
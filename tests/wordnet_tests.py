@@ -11,3 +11,24 @@ def test_key_mapping(key_mapping):
 def test_overkill_closure(overkill):
     ok = set([s for s in wn.all_synsets() if overkill in trips[s]])
     assert ok == overkill.wordnet_closure()
+
+def test_wordnet_table():
+    sample = [wn.synset(s) for s in ["cat.n.01", "move.v.01", "bread.n.01", "happy.a.01", "entity.n.01"]]
+    walked = [set(trips.get_wordnet(s)) for s in sample]
+    try:
+        trips.build_wordnet_table()
+        assert [set(trips.get_wordnet(s)) for s in sample] == walked
+    finally:
+        # later tests use the shared trips without the table
+        trips._wordnet_table = None
+        trips._wordnet_table_depth = None
+
+def test_closure_depths():
+    food = trips["food"]
+    shallow = food.wordnet_closure(max_depth=1)
+    assert shallow <= food.wordnet_closure()
+    assert set(food.wordnet_keys) <= shallow
+    assert all(s.pos() == "n" for s in food.wordnet_closure(pos="n"))
+    words = trips["food"].is_a_closure(max_depth=1)
+    assert food.word_closure(max_depth=1) <= words
+    assert trips["bread"].word_closure(max_depth=1) <= words